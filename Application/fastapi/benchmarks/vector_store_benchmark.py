@@ -0,0 +1,135 @@
+"""Insert and query throughput of the vector store backends.
+
+Run from Application/fastapi, for example:
+
+    python benchmarks/vector_store_benchmark.py --backend local --nodes 20000
+    python benchmarks/vector_store_benchmark.py --backend local --quantization both
+    python benchmarks/vector_store_benchmark.py --backend milvus --nodes 20000
+
+Nodes carry synthetic unit embeddings, so no embedding model, API key or
+network access is needed. Recall@k is measured against exact NumPy search
+over the same vectors.
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from llama_index.core.schema import TextNode
+from llama_index.core.vector_stores import VectorStoreQuery
+from config import fastapi_config
+from services.index_service import create_vector_store
+from utils.retrieval import publication_filters
+
+
+def make_vectors(count, dim, clusters, rng):
+    # Clustered rather than uniform, so nearest neighbours are meaningful
+    centers = rng.standard_normal((clusters, dim)).astype(np.float32)
+    vectors = centers[rng.integers(0, clusters, count)] + 0.3 * rng.standard_normal((count, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def make_nodes(vectors, offset, publications):
+    return [
+        TextNode(id_=f"bench-{offset + i}", text=f"Benchmark node {offset + i}", embedding=vector.tolist(),
+                 metadata={"publication_id": f"pub-{(offset + i) % publications}"})
+        for i, vector in enumerate(vectors)
+    ]
+
+
+def percentile_ms(samples, q):
+    return float(np.percentile(samples, q) * 1000) if samples else 0.0
+
+
+def run(args):
+    rng = np.random.default_rng(args.seed)
+    dim = fastapi_config.EMBED_DIM
+    vectors = make_vectors(args.nodes, dim, args.clusters, rng)
+    queries = vectors[rng.integers(0, args.nodes, args.queries)]
+    queries = queries + 0.05 * rng.standard_normal(queries.shape).astype(np.float32)
+
+    persist_dir = None
+    if args.backend == "local":
+        persist_dir = args.persist_dir or tempfile.mkdtemp(prefix="vector-store-benchmark-")
+        store = create_vector_store("local", persist_dir=persist_dir, quantization=args.quantization,
+                                    rescore_factor=args.rescore_factor)
+    else:
+        store = create_vector_store("milvus", collection_name="vector_store_benchmark", overwrite=True)
+
+    insert_seconds = 0.0
+    for offset in range(0, args.nodes, args.batch_size):
+        # Building the nodes is not part of the store's cost
+        nodes = make_nodes(vectors[offset:offset + args.batch_size], offset, args.publications)
+        started = time.perf_counter()
+        store.add(nodes)
+        insert_seconds += time.perf_counter() - started
+
+    exact = np.argsort(-(queries @ vectors.T), axis=1)[:, :args.top_k]
+    latencies, hits = [], 0
+    for query_vector, expected in zip(queries, exact):
+        started = time.perf_counter()
+        result = store.query(VectorStoreQuery(query_embedding=query_vector.tolist(), similarity_top_k=args.top_k))
+        latencies.append(time.perf_counter() - started)
+        found = {int(node_id.split("-")[1]) for node_id in result.ids}
+        hits += len(found & set(expected.tolist()))
+
+    filtered_latencies = []
+    for i, query_vector in enumerate(queries):
+        started = time.perf_counter()
+        store.query(VectorStoreQuery(query_embedding=query_vector.tolist(), similarity_top_k=args.top_k,
+                                     filters=publication_filters(f"pub-{i % args.publications}")))
+        filtered_latencies.append(time.perf_counter() - started)
+
+    report = {
+        "backend": args.backend,
+        "nodes": args.nodes,
+        "dim": dim,
+        "insert_nodes_per_second": args.nodes / insert_seconds,
+        "query_p50_ms": percentile_ms(latencies, 50),
+        "query_p95_ms": percentile_ms(latencies, 95),
+        "queries_per_second": len(latencies) / sum(latencies),
+        f"recall_at_{args.top_k}": hits / (len(queries) * args.top_k),
+        "filtered_query_p50_ms": percentile_ms(filtered_latencies, 50),
+        "filtered_query_p95_ms": percentile_ms(filtered_latencies, 95),
+    }
+    if args.backend == "local":
+        report["quantization"] = args.quantization
+        report["rescore_factor"] = args.rescore_factor
+        report.update(store.memory_usage())
+    if persist_dir and not args.persist_dir:
+        shutil.rmtree(persist_dir, ignore_errors=True)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--backend", choices=["local", "milvus", "both"], default="local")
+    parser.add_argument("--nodes", type=int, default=20000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--batch-size", type=int, default=fastapi_config.INDEX_BATCH_SIZE)
+    parser.add_argument("--clusters", type=int, default=64)
+    parser.add_argument("--publications", type=int, default=20)
+    parser.add_argument("--quantization", choices=["none", "int8", "both"],
+                        default=fastapi_config.LOCAL_VECTOR_QUANTIZATION, help="Local store only")
+    parser.add_argument("--rescore-factor", type=int, default=fastapi_config.LOCAL_VECTOR_RESCORE_FACTOR)
+    parser.add_argument("--persist-dir", help="Keep the local store here instead of a temporary directory")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    backends = ["local", "milvus"] if args.backend == "both" else [args.backend]
+    quantizations = ["none", "int8"] if args.quantization == "both" else [args.quantization]
+    for backend in backends:
+        for quantization in quantizations if backend == "local" else ["none"]:
+            args.backend, args.quantization = backend, quantization
+            print(json.dumps(run(args), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -20,5 +20,88 @@ class Config:
     SNOWFLAKE_SCHEMA=os.getenv('SNOWFLAKE_SCHEMA')
     ZILLIZ_CLOUD_URI = os.getenv('ZILLIZ_CLOUD_URI')
     ZILLIZ_CLOUD_API_KEY = os.getenv('ZILLIZ_CLOUD_API_KEY')
+    # Multipart uploads to S3: part size in bytes (S3 minimum is 5 MiB) and parts in flight
+    S3_PART_SIZE = int(os.getenv('S3_PART_SIZE', 8 * 1024 * 1024))
+    S3_UPLOAD_CONCURRENCY = int(os.getenv('S3_UPLOAD_CONCURRENCY', 4))
+    # Number of worker processes used to parse PDF pages, 1 keeps parsing serial
+    PDF_PARSE_WORKERS = int(os.getenv('PDF_PARSE_WORKERS', os.cpu_count() or 1))
+    # Documents with fewer pages than this are always parsed serially
+    PDF_PARALLEL_MIN_PAGES = int(os.getenv('PDF_PARALLEL_MIN_PAGES', 8))
+    # Maximum concurrent requests to the NVIDIA VLM / Deplot / LLM endpoints, per process;
+    # PDF parse workers split it between them
+    NIM_MAX_IN_FLIGHT = int(os.getenv('NIM_MAX_IN_FLIGHT', 8))
+    NIM_TIMEOUT = float(os.getenv('NIM_TIMEOUT', 120))
+    # Retries of 429 / 5xx / transport errors, with exponential backoff in seconds
+    NIM_MAX_RETRIES = int(os.getenv('NIM_MAX_RETRIES', 4))
+    NIM_RETRY_BASE_DELAY = float(os.getenv('NIM_RETRY_BASE_DELAY', 1.0))
+    NIM_RETRY_MAX_DELAY = float(os.getenv('NIM_RETRY_MAX_DELAY', 30.0))
+    # Images sent to the VLM / Deplot are downscaled to this longest edge and JPEG quality
+    VLM_IMAGE_MAX_EDGE = int(os.getenv('VLM_IMAGE_MAX_EDGE', 1024))
+    VLM_IMAGE_QUALITY = int(os.getenv('VLM_IMAGE_QUALITY', 85))
+    VLM_IMAGE_MEMO_SIZE = int(os.getenv('VLM_IMAGE_MEMO_SIZE', 256))
+    # Images within this many dHash bits of one already ingested (and with a matching thumbnail) reuse its caption
+    IMAGE_DEDUP_MAX_DISTANCE = int(os.getenv('IMAGE_DEDUP_MAX_DISTANCE', 4))
+    # Content-addressed cache of image descriptions and chart linearizations
+    VLM_CACHE_ENABLED = os.getenv('VLM_CACHE_ENABLED', 'true').lower() == 'true'
+    VLM_CACHE_PATH = os.getenv('VLM_CACHE_PATH', os.path.join(os.getcwd(), "vectorstore", "vlm_cache.sqlite3"))
+    VLM_CACHE_MAX_BYTES = int(os.getenv('VLM_CACHE_MAX_BYTES', 256 * 1024 * 1024))
+    # Local pre-filter that keeps obvious non-charts away from the remote VLM
+    PREFILTER_ENABLED = os.getenv('PREFILTER_ENABLED', 'true').lower() == 'true'
+    PREFILTER_MAX_PALETTE = int(os.getenv('PREFILTER_MAX_PALETTE', 96))
+    PREFILTER_MIN_WHITESPACE = float(os.getenv('PREFILTER_MIN_WHITESPACE', 0.35))
+    PREFILTER_MIN_LINE_DENSITY = float(os.getenv('PREFILTER_MIN_LINE_DENSITY', 0.02))
+    PREFILTER_MAX_EDGE_DENSITY = float(os.getenv('PREFILTER_MAX_EDGE_DENSITY', 0.25))
+    # Parquet tables and table crops, one subdirectory per document hash
+    TABLE_STORE_DIR = os.getenv('TABLE_STORE_DIR', os.path.join(os.getcwd(), "vectorstore", "table_references"))
+    # Nodes embedded and inserted into the vector store per batch
+    INDEX_BATCH_SIZE = int(os.getenv('INDEX_BATCH_SIZE', 256))
+    # Embedding requests: starting/maximum batch size, concurrency and target latency in seconds
+    EMBED_BATCH_SIZE = int(os.getenv('EMBED_BATCH_SIZE', 16))
+    EMBED_MAX_BATCH_SIZE = int(os.getenv('EMBED_MAX_BATCH_SIZE', 50))
+    EMBED_MAX_IN_FLIGHT = int(os.getenv('EMBED_MAX_IN_FLIGHT', 4))
+    EMBED_TARGET_LATENCY = float(os.getenv('EMBED_TARGET_LATENCY', 2.0))
+    # Long-lived headless LibreOffice workers used for PPT/PPTX conversion
+    OFFICE_BINARY = os.getenv('OFFICE_BINARY', 'libreoffice')
+    OFFICE_POOL_SIZE = int(os.getenv('OFFICE_POOL_SIZE', 2))
+    OFFICE_JOB_TIMEOUT = float(os.getenv('OFFICE_JOB_TIMEOUT', 300))
+    OFFICE_STARTUP_TIMEOUT = float(os.getenv('OFFICE_STARTUP_TIMEOUT', 60))
+    # Slide rendering for PPT/PPTX decks; saved images are only a side output
+    SLIDE_RENDER_DPI = int(os.getenv('SLIDE_RENDER_DPI', 72))
+    SLIDE_RENDER_FORMAT = os.getenv('SLIDE_RENDER_FORMAT', 'png')
+    SLIDE_SAVE_IMAGES = os.getenv('SLIDE_SAVE_IMAGES', 'true').lower() == 'true'
+    # Files already ingested by /process_directory/ and the Document ids they produced
+    INGEST_MANIFEST_PATH = os.getenv('INGEST_MANIFEST_PATH', os.path.join(os.getcwd(), "vectorstore", "ingest_manifest.json"))
+    # Background ingestion jobs started by /process_files/ and /process_directory/
+    INGEST_MAX_JOBS = int(os.getenv('INGEST_MAX_JOBS', 2))
+    INGEST_UPLOAD_DIR = os.getenv('INGEST_UPLOAD_DIR', os.path.join(os.getcwd(), "vectorstore", "jobs"))
+    # Vector store backend: "milvus" (server) or "local" (embedded, file-backed, for tests and benchmarks)
+    VECTOR_STORE = os.getenv('VECTOR_STORE', 'milvus')
+    MILVUS_HOST = os.getenv('MILVUS_HOST', '127.0.0.1')
+    MILVUS_PORT = int(os.getenv('MILVUS_PORT', 19530))
+    EMBED_DIM = int(os.getenv('EMBED_DIM', 1024))
+    LOCAL_VECTOR_STORE_DIR = os.getenv('LOCAL_VECTOR_STORE_DIR', os.path.join(os.getcwd(), "vectorstore", "local"))
+    # "int8" scans 1-byte codes and rescores top_k * LOCAL_VECTOR_RESCORE_FACTOR candidates exactly
+    LOCAL_VECTOR_QUANTIZATION = os.getenv('LOCAL_VECTOR_QUANTIZATION', 'none')
+    LOCAL_VECTOR_RESCORE_FACTOR = int(os.getenv('LOCAL_VECTOR_RESCORE_FACTOR', 4))
+    # Rewrite the local store's files once more than this fraction of vector rows belong to deleted nodes
+    LOCAL_VECTOR_COMPACT_RATIO = float(os.getenv('LOCAL_VECTOR_COMPACT_RATIO', 0.3))
+    # Retrieval for /query: "hybrid" fuses BM25 with vector search, "vector" is dense only
+    RETRIEVAL_MODE = os.getenv('RETRIEVAL_MODE', 'hybrid')
+    RETRIEVAL_TOP_K = int(os.getenv('RETRIEVAL_TOP_K', 10))
+    RETRIEVAL_CANDIDATE_K = int(os.getenv('RETRIEVAL_CANDIDATE_K', 20))
+    RRF_K = int(os.getenv('RRF_K', 60))
+    BM25_INDEX_PATH = os.getenv('BM25_INDEX_PATH', os.path.join(os.getcwd(), "vectorstore", "bm25.sqlite3"))
+    BM25_K1 = float(os.getenv('BM25_K1', 1.2))
+    BM25_B = float(os.getenv('BM25_B', 0.75))
+    # Post-retrieval stage: near-duplicate removal, reranking and a context token budget
+    CONTEXT_DEDUP_THRESHOLD = float(os.getenv('CONTEXT_DEDUP_THRESHOLD', 0.6))
+    CONTEXT_TOKEN_BUDGET = int(os.getenv('CONTEXT_TOKEN_BUDGET', 3000))
+    RERANK_SCORER = os.getenv('RERANK_SCORER', 'nvidia')
+    RERANK_MODEL = os.getenv('RERANK_MODEL', 'nvidia/nv-rerankqa-mistral-4b-v3')
+    # Semantic cache in front of /query, invalidated whenever the index changes
+    ANSWER_CACHE_ENABLED = os.getenv('ANSWER_CACHE_ENABLED', 'true').lower() == 'true'
+    ANSWER_CACHE_THRESHOLD = float(os.getenv('ANSWER_CACHE_THRESHOLD', 0.95))
+    ANSWER_CACHE_TTL = float(os.getenv('ANSWER_CACHE_TTL', 3600))
+    ANSWER_CACHE_MAX_ENTRIES = int(os.getenv('ANSWER_CACHE_MAX_ENTRIES', 512))
     
 fastapi_config = Config()
\ No newline at end of file
@@ -1,24 +1,27 @@
-from fastapi import FastAPI, UploadFile, File, HTTPException
-from typing import List
-from fastapi.responses import JSONResponse
-from llama_index.core import Settings, VectorStoreIndex, StorageContext
-from llama_index.vector_stores.milvus import MilvusVectorStore
-from llama_index.core.node_parser import SentenceSplitter
-from llama_index.embeddings.nvidia import NVIDIAEmbedding
-from llama_index.llms.nvidia import NVIDIA
+from fastapi import FastAPI, UploadFile, HTTPException, Request
+from typing import List, Optional, Union
+from fastapi.responses import JSONResponse, StreamingResponse
 from pydantic import BaseModel
 from typing import List
 from services.document_service import get_all_documents
-import shutil
+import json
 import os
+import uuid
+from contextlib import asynccontextmanager
 
 from fastapi.middleware.cors import CORSMiddleware
 
-from utils.s3_utils import list_buckets, list_s3_documents, upload_file, download_file, check_connection
+from utils.s3_utils import list_buckets, list_s3_documents, upload_file, download_file, check_connection, stream_multipart_upload
 from config import fastapi_config # Contains env variables, access by eg: "fastapi_config.AWS_ACCESS_KEY_ID"
 from routers import rag
-from utils.document_processors import load_multimodal_data, load_data_from_directory
+from services.index_service import startup, shutdown
+from services.query_service import answer_query, stream_query
+from services.ingest_jobs import job_manager, ingest_files, ingest_directory, save_uploads, remove_uploads
 from utils.snowflake_client import SnowflakeClient
+from utils.vlm_cache import get_cache
+from utils.multipart_stream import open_multipart_file
+from utils.answer_cache import get_answer_cache
+from utils import metrics
 
 
 from IPython import embed
@@ -30,7 +33,14 @@ class DocumentSelection(BaseModel):
     document_id: str
 
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app):
+    startup()
+    yield
+    shutdown()
+
+
+app = FastAPI(lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -41,24 +51,11 @@ app.add_middleware(
 )
 
 
-def initialize_settings():
-    Settings.embed_model = NVIDIAEmbedding(model="nvidia/nv-embedqa-e5-v5", truncate="END")
-    Settings.llm = NVIDIA(model="meta/llama-3.1-70b-instruct")
-    Settings.text_splitter = SentenceSplitter(chunk_size=600)
-
-def create_index(documents):
-    vector_store = MilvusVectorStore(
-            host = "127.0.0.1",
-            port = 19530,
-            dim = 1024
-    )
-    storage_context = StorageContext.from_defaults(vector_store=vector_store)
-    return VectorStoreIndex.from_documents(documents, storage_context=storage_context)
-
-
 #pydantic model for query
 class QueryRequest(BaseModel):
     query: str
+    # One publication id (or file name) or a list of them; None searches everything
+    publication_ids: Optional[Union[str, List[str]]] = None
 
 @app.get("/")
 async def read_root():
@@ -102,48 +99,92 @@ async def list_documents():
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/upload")
-async def upload_to_s3(file: UploadFile = File(...)):
+async def upload_to_s3(request: Request, filename: Optional[str] = None):
+    # Accepts a multipart form with a "file" field, or the raw file as the
+    # request body named by the filename query parameter. Either way the
+    # body streams straight to S3, without a temp file.
+    content_type = request.headers.get("content-type", "")
+    if content_type.startswith("multipart/form-data"):
+        try:
+            upload = await open_multipart_file(request.stream(), content_type)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        if upload is None:
+            raise HTTPException(status_code=400, detail="Missing file field.")
+        form_filename, body = upload
+        key = filename or form_filename
+    else:
+        if not filename:
+            raise HTTPException(status_code=400, detail="Missing filename query parameter.")
+        key = filename
+        body = request.stream()
+
     try:
-        with open(file.filename, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
-        
-        if upload_file(file.filename, fastapi_config.S3_BUCKET_NAME, file.filename):
-            return JSONResponse(content={"message": "File uploaded successfully"}, status_code=200)
-        else:
-            return JSONResponse(content={"message": "Failed to upload file"}, status_code=500)
-    finally:
-        if os.path.exists(file.filename):
-            os.remove(file.filename)
+        result = await stream_multipart_upload(body, key)
+    except Exception as e:
+        return JSONResponse(content={"message": f"Failed to upload file: {e}"}, status_code=500)
+    return JSONResponse(content={"message": "File uploaded successfully", **result}, status_code=200)
+
 
+def job_accepted(job):
+    return JSONResponse(status_code=202, content={
+        "message": "Ingestion job queued.",
+        "job_id": job.id,
+        "status_url": f"/jobs/{job.id}",
+    })
 
 @app.post("/process_files/")
-async def process_files(files: list[UploadFile]):
-    # set_environment_variables()
-    initialize_settings()
-    documents = load_multimodal_data(files)
-    index = create_index(documents)
-    return JSONResponse(content={"message": "Files processed and index created!"})
+def process_files(files: list[UploadFile]):
+    # The uploads only live as long as the request, so copy them for the job
+    upload_dir = os.path.join(fastapi_config.INGEST_UPLOAD_DIR, uuid.uuid4().hex)
+    paths = save_uploads(files, upload_dir)
+    job = job_manager.submit("files", paths, ingest_files, cleanup=lambda: remove_uploads(upload_dir))
+    return job_accepted(job)
 
 @app.post("/process_directory/")
-async def process_directory(directory_path: str):
+def process_directory(directory_path: str):
     if not os.path.isdir(directory_path):
         raise HTTPException(status_code=400, detail="Invalid directory path.")
-    # set_environment_variables()
-    initialize_settings()
-    documents = load_data_from_directory(directory_path)
-    index = create_index(documents)
-    return JSONResponse(content={"message": "Directory processed and index created!"})
+    job = job_manager.submit("directory", [], lambda job: ingest_directory(job, directory_path))
+    return job_accepted(job)
+
+@app.get("/jobs")
+def list_jobs():
+    return [job.to_dict() for job in job_manager.list()]
+
+@app.get("/jobs/{job_id}")
+def get_job(job_id: str):
+    job = job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found.")
+    return job.to_dict()
+
+@app.delete("/jobs/{job_id}")
+def cancel_job(job_id: str):
+    job = job_manager.cancel(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found.")
+    return job.to_dict()
 
 
 @app.post("/query")
-async def query_index(request: QueryRequest):
-    query = request.query
-    # Assuming you have a global index or a way to retrieve the index
-    response = st.session_state['index'].as_query_engine(similarity_top_k=20, streaming=True).query(query)
-    full_response = ""
-    for token in response.response_gen:
-        full_response += token
-    return JSONResponse(content={"response": full_response})
+def query_index(request: QueryRequest):
+    result, cached = answer_query(request.query, request.publication_ids)
+    return JSONResponse(content={**result, "cached": cached})
+
+
+@app.post("/query/stream")
+def query_stream(request: QueryRequest):
+    def events():
+        try:
+            for event, data in stream_query(request.query, request.publication_ids):
+                yield f"event: {event}\ndata: {json.dumps(data)}\n\n"
+        except Exception as e:
+            print(f"Error streaming query: {e}")
+            yield f"event: error\ndata: {json.dumps(str(e))}\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
 
 
 @app.get("/list_documents_info")
@@ -159,27 +200,29 @@ def list_documents_info():
         raise HTTPException(status_code=500, detail=str(e))
 
 
-index = None
+@app.get("/metrics")
+def get_metrics():
+    counters = metrics.snapshot()
+    if counters.get("embedding_seconds"):
+        counters["embedding_nodes_per_second"] = counters.get("embedded_nodes", 0) / counters["embedding_seconds"]
+    if counters.get("context_queries"):
+        counters["context_tokens_per_query"] = counters.get("context_tokens", 0) / counters["context_queries"]
+    return counters
+
+@app.get("/vlm_cache_stats")
+def vlm_cache_stats():
+    cache = get_cache()
+    if cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **cache.stats()}
+
+@app.get("/answer_cache_stats")
+def answer_cache_stats():
+    cache = get_answer_cache()
+    if cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **cache.stats()}
 
-@app.post("/create_index")
-async def create_index_endpoint(directory: str):
-    global index
-    try:
-        index = create_index(directory)
-        return {"message": "Index created successfully"}
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
-
-@app.post("/query")
-async def query_endpoint(query: str):
-    global index
-    if not index:
-        raise HTTPException(status_code=400, detail="Index not created")
-    try:
-        response = query_index(index, query)
-        return {"response": response}
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
 
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,95 @@
+import threading
+from llama_index.core import Settings, VectorStoreIndex
+from llama_index.core.node_parser import SentenceSplitter
+from llama_index.embeddings.nvidia import NVIDIAEmbedding
+from llama_index.llms.nvidia import NVIDIA
+from config import fastapi_config
+from utils import nim_client
+from utils.bm25_index import get_lexical_index
+from utils.embedding import get_embedder
+from utils.office_pool import shutdown_office_pool
+from utils.document_processors import shutdown_parse_pool
+from utils.publications import publication_id_from_source
+
+
+def initialize_settings():
+    # One request per BatchEmbedder batch, see utils.embedding
+    Settings.embed_model = NVIDIAEmbedding(model="nvidia/nv-embedqa-e5-v5", truncate="END",
+                                           embed_batch_size=fastapi_config.EMBED_MAX_BATCH_SIZE)
+    Settings.llm = NVIDIA(model="meta/llama-3.1-70b-instruct")
+    Settings.text_splitter = SentenceSplitter(chunk_size=600)
+
+def create_vector_store(backend=None, **kwargs):
+    """Create the vector store named by backend, defaulting to the VECTOR_STORE setting."""
+    backend = backend or fastapi_config.VECTOR_STORE
+    if backend == "local":
+        from utils.local_vector_store import LocalVectorStore
+        kwargs.setdefault("quantization", fastapi_config.LOCAL_VECTOR_QUANTIZATION)
+        kwargs.setdefault("rescore_factor", fastapi_config.LOCAL_VECTOR_RESCORE_FACTOR)
+        kwargs.setdefault("compact_ratio", fastapi_config.LOCAL_VECTOR_COMPACT_RATIO)
+        return LocalVectorStore(kwargs.pop("persist_dir", fastapi_config.LOCAL_VECTOR_STORE_DIR),
+                                dim=fastapi_config.EMBED_DIM, **kwargs)
+    if backend == "milvus":
+        # Only needed, and only has to be installed, when Milvus is the backend
+        from llama_index.vector_stores.milvus import MilvusVectorStore
+        return MilvusVectorStore(
+                host = fastapi_config.MILVUS_HOST,
+                port = fastapi_config.MILVUS_PORT,
+                dim = fastapi_config.EMBED_DIM,
+                **kwargs
+        )
+    raise ValueError(f"Unknown vector store backend: {backend}")
+
+
+# One index over the persistent collection per process. Ingestion jobs
+# insert into it and queries read from it, so the model clients and the
+# Milvus connection are only set up once.
+_index = None
+_index_lock = threading.Lock()
+# Bumped on every insert or delete so caches keyed on the index can tell
+_index_version = 0
+
+
+def startup():
+    """Build the shared index and warm the long-lived clients."""
+    global _index
+    with _index_lock:
+        if _index is None:
+            initialize_settings()
+            _index = VectorStoreIndex.from_vector_store(create_vector_store())
+            backfill_publication_ids(_index.vector_store, get_lexical_index())
+    nim_client.get_client()
+    get_embedder()
+    return _index
+
+def backfill_publication_ids(vector_store, lexical_index=None):
+    """Tag nodes ingested before nodes carried a publication id, from their source metadata.
+
+    Milvus cannot update metadata in place; untagged Milvus nodes only match
+    publication filters once their files are ingested again.
+    """
+    for store in (vector_store, lexical_index):
+        if hasattr(store, "backfill_publication_ids"):
+            tagged = store.backfill_publication_ids(publication_id_from_source)
+            if tagged:
+                print(f"Tagged {tagged} nodes in {type(store).__name__} with a publication id")
+
+def shutdown():
+    global _index
+    with _index_lock:
+        _index = None
+    nim_client.close()
+    shutdown_office_pool()
+    shutdown_parse_pool()
+
+def get_index():
+    """Return the shared VectorStoreIndex, building it if startup has not run."""
+    return _index or startup()
+
+def index_version():
+    return _index_version
+
+def bump_index_version():
+    global _index_version
+    with _index_lock:
+        _index_version += 1
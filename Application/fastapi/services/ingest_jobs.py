@@ -0,0 +1,273 @@
+import os
+import shutil
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from config import fastapi_config
+from services.index_service import get_index, bump_index_version
+from utils.document_processors import iter_data_from_file
+from utils.image_dedup import ImageRegistry
+from utils.bm25_index import get_lexical_index
+from utils.indexing import insert_documents
+from utils.ingest_manifest import IngestManifest
+from utils.publications import publication_id
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class IngestJob:
+    """State and progress of one background ingestion job.
+
+    Each file moves through the stages pending -> parsing -> indexing ->
+    done (or failed / cancelled); the job itself is queued, running,
+    succeeded, failed or cancelled.
+    """
+
+    def __init__(self, kind, paths):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.status = "queued"
+        self.error = None
+        self.result = {}
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.files = OrderedDict(
+            (path, {"stage": "pending", "documents": 0, "nodes": 0, "error": None}) for path in paths
+        )
+        self._cancel_event = threading.Event()
+        self._lock = threading.Lock()
+
+    @property
+    def cancel_requested(self):
+        return self._cancel_event.is_set()
+
+    def cancel(self):
+        self._cancel_event.set()
+
+    def check_cancelled(self):
+        if self._cancel_event.is_set():
+            raise JobCancelled()
+
+    def set_file(self, path, **fields):
+        with self._lock:
+            self.files.setdefault(path, {"stage": "pending", "documents": 0, "nodes": 0, "error": None}).update(fields)
+
+    def track(self, path, documents):
+        """Pass Documents through while counting them and honouring cancellation."""
+        self.set_file(path, stage="parsing")
+        for doc in documents:
+            self.check_cancelled()
+            with self._lock:
+                self.files[path]["documents"] += 1
+            yield doc
+        self.set_file(path, stage="indexing")
+
+    def to_dict(self):
+        with self._lock:
+            files = [{"path": path, **progress} for path, progress in self.files.items()]
+        stages = {}
+        for progress in files:
+            stages[progress["stage"]] = stages.get(progress["stage"], 0) + 1
+        return {
+            "job_id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "error": self.error,
+            "result": self.result,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "stages": stages,
+            "files": files,
+        }
+
+
+class JobManager:
+    """Runs ingestion jobs on a bounded thread pool and keeps their state in memory."""
+
+    def __init__(self, max_workers=None, max_finished=100):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers or fastapi_config.INGEST_MAX_JOBS,
+                                            thread_name_prefix="ingest-job")
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+        self.max_finished = max_finished
+
+    def submit(self, kind, paths, work, cleanup=None):
+        """Queue work(job) and return the new job.
+
+        cleanup(), if given, runs once the job has finished, however it ended,
+        including when it was cancelled before it started.
+        """
+        job = IngestJob(kind, paths)
+        with self._lock:
+            self._jobs[job.id] = job
+            self._prune()
+        self._executor.submit(self._run, job, work, cleanup)
+        return job
+
+    def _prune(self):
+        finished = [job_id for job_id, job in self._jobs.items() if job.finished_at is not None]
+        for job_id in finished[:max(0, len(finished) - self.max_finished)]:
+            del self._jobs[job_id]
+
+    def _run(self, job, work, cleanup=None):
+        try:
+            job.check_cancelled()
+            job.status = "running"
+            job.started_at = time.time()
+            work(job)
+            job.status = "succeeded"
+        except JobCancelled:
+            job.status = "cancelled"
+            for path, progress in list(job.files.items()):
+                if progress["stage"] not in ("done", "failed"):
+                    job.set_file(path, stage="cancelled")
+        except Exception as e:
+            print(f"Error in ingestion job {job.id}: {e}")
+            job.status = "failed"
+            job.error = str(e)
+        finally:
+            if cleanup is not None:
+                try:
+                    cleanup()
+                except Exception as e:
+                    print(f"Error cleaning up ingestion job {job.id}: {e}")
+            job.finished_at = time.time()
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def list(self):
+        with self._lock:
+            return list(self._jobs.values())
+
+    def cancel(self, job_id):
+        """Request cancellation; the job stops at its next document boundary."""
+        job = self.get(job_id)
+        if job is not None:
+            job.cancel()
+        return job
+
+
+def _delete_documents(vector_store, lexical_index, doc_ids):
+    for doc_id in doc_ids:
+        vector_store.delete(doc_id)
+        if lexical_index is not None:
+            lexical_index.delete_ref_doc(doc_id)
+
+
+def _rollback(index, path, doc_ids):
+    # Nodes of a partly inserted file have no manifest entry, so they would
+    # be duplicated by the next run
+    try:
+        _delete_documents(index.vector_store, get_lexical_index(), doc_ids)
+    except Exception as e:
+        print(f"Error removing partly ingested {path}: {e}")
+
+
+def _ingest_paths(job, paths, image_registry, manifest=None):
+    index = get_index()
+    for path in paths:
+        job.check_cancelled()
+        # Reported so clients can scope queries to exactly what was indexed
+        job.set_file(path, publication_id=publication_id(path))
+        doc_ids = []
+        try:
+            documents = job.track(path, iter_data_from_file(path, image_registry))
+            nodes = insert_documents(index, (doc_ids.append(doc.doc_id) or doc for doc in documents),
+                                     lexical_index=get_lexical_index())
+        except JobCancelled:
+            _rollback(index, path, doc_ids)
+            raise
+        except Exception as e:
+            print(f"Error processing {path}: {e}")
+            _rollback(index, path, doc_ids)
+            job.set_file(path, stage="failed", error=str(e))
+            continue
+        finally:
+            # Even a partial insert changes what queries can see
+            bump_index_version()
+        job.set_file(path, stage="done", nodes=nodes)
+        if manifest is not None:
+            manifest.record(path, doc_ids)
+
+
+def ingest_files(job):
+    """Job body for /process_files/: index files already saved by save_uploads."""
+    with ImageRegistry() as image_registry:
+        _ingest_paths(job, list(job.files), image_registry)
+
+
+# One lock per manifest file. A directory job holds it from plan() to save(),
+# so concurrent jobs neither ingest the same files twice nor overwrite each
+# other's manifest entries.
+_manifest_locks = {}
+_manifest_locks_lock = threading.Lock()
+
+
+def _manifest_lock(path=None):
+    path = os.path.abspath(path or fastapi_config.INGEST_MANIFEST_PATH)
+    with _manifest_locks_lock:
+        return _manifest_locks.setdefault(path, threading.Lock())
+
+
+def ingest_directory(job, directory_path):
+    """Job body for /process_directory/: index new and changed files, drop stale ones.
+
+    Directory jobs run one at a time; a job waits for the one before it.
+    """
+    with _manifest_lock():
+        job.check_cancelled()
+        _ingest_directory(job, directory_path)
+
+
+def _ingest_directory(job, directory_path):
+    manifest = IngestManifest()
+    plan = manifest.plan(directory_path)
+    job.result = {status: len(paths) for status, paths in plan.items()}
+    for path in plan["added"] + plan["updated"]:
+        job.set_file(path, stage="pending")
+    for path in plan["skipped"]:
+        job.set_file(path, stage="skipped")
+    vector_store = get_index().vector_store
+    lexical_index = get_lexical_index()
+    # Stale nodes go first: re-parsed text blocks reuse their deterministic ids
+    for path in plan["updated"] + plan["deleted"]:
+        _delete_documents(vector_store, lexical_index, manifest.forget(path))
+        bump_index_version()
+    try:
+        with ImageRegistry() as image_registry:
+            _ingest_paths(job, plan["added"] + plan["updated"], image_registry, manifest)
+    finally:
+        # Files finished before a cancellation or failure stay recorded
+        manifest.save()
+
+
+def remove_uploads(upload_dir):
+    shutil.rmtree(upload_dir, ignore_errors=True)
+
+
+def save_uploads(files, upload_dir):
+    """Copy UploadFiles into upload_dir so a job can read them after the request ends.
+
+    Each upload gets its own subdirectory, so uploads sharing a file name
+    keep both their content and their name.
+    """
+    paths = []
+    for number, file in enumerate(files):
+        file_dir = os.path.join(upload_dir, str(number))
+        os.makedirs(file_dir, exist_ok=True)
+        path = os.path.join(file_dir, os.path.basename(file.filename))
+        with open(path, "wb") as out:
+            shutil.copyfileobj(file.file, out)
+        paths.append(path)
+    return paths
+
+
+job_manager = JobManager()
@@ -0,0 +1,106 @@
+from llama_index.core import Settings
+from llama_index.core.query_engine import RetrieverQueryEngine
+from llama_index.core.schema import QueryBundle
+from services.index_service import get_index, index_version
+from utils.answer_cache import get_answer_cache
+from utils.bm25_index import get_lexical_index
+from utils.postprocessing import ContextPacker
+from utils.publications import normalize_publication_ids
+from utils.retrieval import HybridRetriever
+
+
+_packer = None
+
+
+def get_context_packer():
+    global _packer
+    if _packer is None:
+        _packer = ContextPacker.from_config()
+    return _packer
+
+
+def build_query_engine(streaming=False, publication_ids=()):
+    """Query engine over the shared index, hybrid when the lexical index is enabled.
+
+    Retrieval is limited to publication_ids when given. Retrieved nodes go
+    through the ContextPacker before generation.
+    """
+    retriever = HybridRetriever(get_index(), get_lexical_index(), publication_ids=publication_ids)
+    return RetrieverQueryEngine.from_args(retriever, node_postprocessors=[get_context_packer()],
+                                          streaming=streaming)
+
+
+def source_metadata(source_nodes):
+    """Summarize retrieved nodes for clients: id, score and where they came from."""
+    return [
+        {
+            "node_id": node.node.node_id,
+            "score": node.score,
+            "source": node.node.metadata.get("source"),
+            "type": node.node.metadata.get("type"),
+            "page_num": node.node.metadata.get("page_num"),
+            "publication_id": node.node.metadata.get("publication_id"),
+        }
+        for node in source_nodes
+    ]
+
+
+def _lookup(cache, query, version, scope):
+    # Returns (cached result or None, query embedding or None)
+    if cache is None:
+        return None, None
+    result = cache.get_text(query, version, scope)
+    if result is not None:
+        return result, None
+    # Embedded once here and reused by the retriever on a miss
+    embedding = Settings.embed_model.get_query_embedding(query)
+    return cache.get(query, embedding, version, scope), embedding
+
+
+def answer_query(query, publication_ids=None):
+    """Answer a query from the shared index, optionally within some publications.
+
+    Returns ({"response", "sources"}, cached).
+    """
+    publication_ids = normalize_publication_ids(publication_ids)
+    cache = get_answer_cache()
+    version = index_version()
+    result, embedding = _lookup(cache, query, version, publication_ids)
+    if result is not None:
+        return result, True
+
+    query_engine = build_query_engine(publication_ids=publication_ids)
+    response = query_engine.query(QueryBundle(query_str=query, embedding=embedding))
+    result = {"response": str(response), "sources": source_metadata(response.source_nodes)}
+    if cache is not None:
+        cache.put(query, embedding, version, result, publication_ids)
+    return result, False
+
+
+def stream_query(query, publication_ids=None):
+    """Answer a query as a stream of (event, data) pairs.
+
+    Emits "sources" once retrieval is done, then one "token" per generated
+    chunk, then "done". A cached answer arrives as a single token.
+    """
+    publication_ids = normalize_publication_ids(publication_ids)
+    cache = get_answer_cache()
+    version = index_version()
+    result, embedding = _lookup(cache, query, version, publication_ids)
+    if result is not None:
+        yield "sources", result["sources"]
+        yield "token", result["response"]
+        yield "done", {"cached": True}
+        return
+
+    query_engine = build_query_engine(streaming=True, publication_ids=publication_ids)
+    response = query_engine.query(QueryBundle(query_str=query, embedding=embedding))
+    sources = source_metadata(response.source_nodes)
+    yield "sources", sources
+    tokens = []
+    for token in response.response_gen:
+        tokens.append(token)
+        yield "token", token
+    if cache is not None:
+        cache.put(query, embedding, version, {"response": "".join(tokens), "sources": sources}, publication_ids)
+    yield "done", {"cached": False}
@@ -0,0 +1,18 @@
+from llama_index.core.schema import MetadataMode, TextNode
+from utils.bm25_index import BM25Index
+from utils.publications import set_publication_id
+
+
+def test_hits_keep_metadata_exclusions(tmp_path):
+    index = BM25Index(str(tmp_path / "bm25.sqlite3"))
+    keys = ["table_num", "doc_hash"]
+    node = TextNode(id_="t1", text="quarterly revenue table",
+                    metadata={"caption": "Revenue", "table_num": 1, "doc_hash": "ab" * 32},
+                    excluded_embed_metadata_keys=list(keys), excluded_llm_metadata_keys=list(keys))
+    set_publication_id(node, "annual-report")
+    index.add_nodes([node])
+
+    (hit,) = index.search("revenue", publication_ids=("annual-report",))
+    for mode in (MetadataMode.LLM, MetadataMode.EMBED):
+        assert hit.node.get_content(mode) == node.get_content(mode)
+    assert "doc_hash" not in hit.node.get_content(MetadataMode.LLM)
@@ -0,0 +1,52 @@
+import threading
+import time
+from io import BytesIO
+from PIL import Image, ImageDraw
+from utils.image_dedup import ImageRegistry, image_fingerprint
+
+
+def _chart(heights, size=(800, 600), image_format="PNG", quality=95):
+    img = Image.new("RGB", (800, 600), "white")
+    draw = ImageDraw.Draw(img)
+    draw.line([(60, 40), (60, 540), (760, 540)], fill="black", width=2)
+    for i, height in enumerate(heights):
+        draw.rectangle([100 + i * 130, 540 - height, 180 + i * 130, 540], fill=(70, 130, 180))
+    buffer = BytesIO()
+    img.resize(size, Image.LANCZOS).save(buffer, image_format, quality=quality)
+    return buffer.getvalue()
+
+
+def test_registry_matches_near_duplicates_only(tmp_path):
+    heights = [200, 320, 150, 420, 280]
+    with ImageRegistry(str(tmp_path / "registry.sqlite3"), max_distance=4) as registry:
+        image_id, known = registry.claim(*image_fingerprint(_chart(heights)))
+        assert known is None
+        registry.record(image_id, "chart.png", "a bar chart")
+
+        rescaled = _chart(heights, size=(640, 480), image_format="JPEG", quality=70)
+        assert registry.claim(*image_fingerprint(rescaled)) == (image_id, ("chart.png", "a bar chart"))
+        # Same layout, one bar taller: the thumbnails disagree
+        changed_id, known = registry.claim(*image_fingerprint(_chart([200, 320, 150, 420, 380])))
+        assert changed_id != image_id and known is None
+
+
+def test_claim_waits_for_another_describer(tmp_path):
+    fingerprint = image_fingerprint(_chart([200, 320, 150, 420, 280]))
+    with ImageRegistry(str(tmp_path / "registry.sqlite3")) as registry:
+        image_id, _ = registry.claim(*fingerprint)
+        # A repeat from the same thread is the caller's own claim
+        assert registry.claim(*fingerprint, timeout=0) == (image_id, None)
+
+        results = []
+        waiter = threading.Thread(target=lambda: results.append(registry.claim(*fingerprint, timeout=0)))
+        waiter.start()
+        waiter.join()
+        assert results == [(None, None)]
+
+        waiter = threading.Thread(target=lambda: results.append(registry.claim(*fingerprint)))
+        waiter.start()
+        time.sleep(0.3)
+        assert waiter.is_alive()
+        registry.record(image_id, "chart.png", "a bar chart")
+        waiter.join()
+        assert results[-1] == (image_id, ("chart.png", "a bar chart"))
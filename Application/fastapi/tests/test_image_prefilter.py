@@ -0,0 +1,77 @@
+from io import BytesIO
+import numpy as np
+import pytest
+from PIL import Image, ImageDraw
+from utils.image_prefilter import image_statistics, is_likely_graph
+
+
+def _encode(img, image_format="PNG"):
+    buffer = BytesIO()
+    img.save(buffer, image_format)
+    return buffer.getvalue()
+
+
+def bar_chart():
+    img = Image.new("RGB", (800, 600), "white")
+    draw = ImageDraw.Draw(img)
+    draw.line([(60, 40), (60, 540), (760, 540)], fill="black", width=2)
+    for i, height in enumerate([200, 320, 150, 420, 280]):
+        draw.rectangle([100 + i * 130, 540 - height, 180 + i * 130, 540], fill=(70, 130, 180))
+    return _encode(img)
+
+
+def dark_line_chart():
+    # Faint 1 px gridlines on a dark background, larger than the color sample
+    img = Image.new("RGB", (1200, 800), (20, 24, 32))
+    draw = ImageDraw.Draw(img)
+    for y in range(80, 800, 80):
+        draw.line([(60, y), (1160, y)], fill=(60, 64, 72), width=1)
+    xs = np.linspace(60, 1160, 40)
+    rng = np.random.default_rng(0)
+    for color in [(0, 200, 255), (255, 140, 0)]:
+        ys = 400 + np.cumsum(rng.normal(0, 20, len(xs)))
+        draw.line(list(zip(xs.tolist(), ys.tolist())), fill=color, width=2)
+    return _encode(img)
+
+
+def ruled_table():
+    img = Image.new("RGB", (900, 500), "white")
+    draw = ImageDraw.Draw(img)
+    for y in range(20, 500, 40):
+        draw.line([(20, y), (880, y)], fill="black", width=1)
+    for x in range(20, 900, 215):
+        draw.line([(x, 20), (x, 460)], fill="black", width=1)
+    for row in range(11):
+        for col in range(4):
+            draw.text((30 + col * 215, 32 + row * 40), f"{row * 17 + col}.5%", fill="black")
+    return _encode(img)
+
+
+def color_photo():
+    rng = np.random.default_rng(1)
+    y, x = np.mgrid[0:600, 0:800]
+    base = np.stack([x / 800 * 255, y / 600 * 255, (x + y) / 1400 * 255], axis=2)
+    pixels = np.clip(base + rng.normal(0, 20, base.shape), 0, 255).astype(np.uint8)
+    return _encode(Image.fromarray(pixels), "JPEG")
+
+
+def grainy_gray_photo():
+    # Few colors, so only the edge density tells it apart from a chart
+    rng = np.random.default_rng(2)
+    y, x = np.mgrid[0:600, 0:800]
+    base = 60 + 120 * np.sin(x / 90.0) * np.cos(y / 70.0) ** 2
+    pixels = np.clip(base + rng.normal(0, 40, base.shape), 0, 255).astype(np.uint8)
+    return _encode(Image.fromarray(pixels).convert("RGB"), "JPEG")
+
+
+@pytest.mark.parametrize("fixture, expected", [
+    (bar_chart, True),
+    (dark_line_chart, True),
+    (ruled_table, True),
+    (color_photo, False),
+    (grainy_gray_photo, False),
+])
+def test_is_likely_graph(fixture, expected):
+    stats = image_statistics(fixture())
+    assert is_likely_graph(stats, max_palette=96, min_whitespace=0.35, min_line_density=0.02,
+                           max_edge_density=0.25) is expected, stats
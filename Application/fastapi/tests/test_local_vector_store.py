@@ -0,0 +1,74 @@
+import numpy as np
+import pytest
+from llama_index.core.schema import NodeRelationship, RelatedNodeInfo, TextNode
+from llama_index.core.vector_stores import VectorStoreQuery
+from utils.local_vector_store import LocalVectorStore
+
+DIM = 8
+
+
+def _node(node_id, row):
+    # Each node is its own document, so delete(node_id) drops it
+    return TextNode(id_=node_id, text=node_id, embedding=np.eye(DIM)[row].tolist(),
+                    relationships={NodeRelationship.SOURCE: RelatedNodeInfo(node_id=node_id)})
+
+
+def _top(store, row):
+    result = store.query(VectorStoreQuery(query_embedding=np.eye(DIM)[row].tolist(), similarity_top_k=1))
+    return result.ids[0], result.similarities[0]
+
+
+@pytest.mark.parametrize("quantization", ["none", "int8"])
+def test_failed_add_leaves_no_orphan_rows(tmp_path, quantization):
+    store = LocalVectorStore(str(tmp_path), dim=DIM, quantization=quantization)
+    store.add([_node("n0", 0)])
+    # A repeated node id in one batch fails the insert after the vectors were written
+    for _ in range(2):
+        with pytest.raises(Exception):
+            store.add([_node("n1", 1), _node("n1", 1)])
+    store.add([_node("n2", 2)])
+
+    reopened = LocalVectorStore(str(tmp_path), dim=DIM, quantization=quantization)
+    for current in (store, reopened):
+        assert current.count() == 2
+        assert _top(current, 0) == ("n0", pytest.approx(1.0))
+        assert _top(current, 2) == ("n2", pytest.approx(1.0))
+        assert _top(current, 1)[1] == pytest.approx(0.0)
+
+
+def test_failed_replace_keeps_existing_node(tmp_path):
+    store = LocalVectorStore(str(tmp_path), dim=DIM)
+    store.add([_node("n0", 0)])
+    with pytest.raises(Exception):
+        store.add([_node("n0", 3), _node("n0", 3)])
+    assert store.count() == 1
+    assert _top(store, 0) == ("n0", pytest.approx(1.0))
+
+
+@pytest.mark.parametrize("quantization", ["none", "int8"])
+def test_compact_drops_dead_rows(tmp_path, quantization):
+    store = LocalVectorStore(str(tmp_path), dim=DIM, quantization=quantization, compact_ratio=1.0)
+    store.add([_node(f"n{row}", row) for row in range(DIM)])
+    for row in range(0, DIM, 2):
+        store.delete(f"n{row}")
+    assert store.memory_usage()["rows"] == DIM
+
+    store.compact()
+    reopened = LocalVectorStore(str(tmp_path), dim=DIM, quantization=quantization, compact_ratio=1.0)
+    for current in (store, reopened):
+        assert current.memory_usage()["rows"] == current.count() == DIM // 2
+        assert (tmp_path / "vectors.f32").stat().st_size == DIM // 2 * DIM * 4
+        for row in range(1, DIM, 2):
+            assert _top(current, row) == (f"n{row}", pytest.approx(1.0))
+
+
+def test_compacts_past_dead_ratio(tmp_path):
+    store = LocalVectorStore(str(tmp_path), dim=DIM, compact_ratio=0.3)
+    store.add([_node(f"n{row}", row) for row in range(4)])
+    store.delete("n0")
+    assert store.memory_usage()["rows"] == 4
+    # Replacing a node leaves its old row dead too
+    store.add([_node("n1", 5)])
+    assert store.memory_usage()["rows"] == 3
+    assert _top(store, 5) == ("n1", pytest.approx(1.0))
+    assert _top(store, 3) == ("n3", pytest.approx(1.0))
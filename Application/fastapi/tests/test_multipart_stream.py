@@ -0,0 +1,35 @@
+import asyncio
+from utils.multipart_stream import open_multipart_file
+
+BOUNDARY = "test-boundary"
+CONTENT_TYPE = f"multipart/form-data; boundary={BOUNDARY}"
+
+
+def _body(payload):
+    return (
+        f"--{BOUNDARY}\r\nContent-Disposition: form-data; name=\"note\"\r\n\r\nhello\r\n"
+        f"--{BOUNDARY}\r\nContent-Disposition: form-data; name=\"file\"; filename=\"report.pdf\"\r\n"
+        "Content-Type: application/pdf\r\n\r\n"
+    ).encode() + payload + f"\r\n--{BOUNDARY}--\r\n".encode()
+
+
+async def _stream(data, chunk_size):
+    for start in range(0, len(data), chunk_size):
+        yield data[start:start + chunk_size]
+
+
+async def _read(body, field_name="file"):
+    upload = await open_multipart_file(_stream(body, 7), CONTENT_TYPE, field_name)
+    if upload is None:
+        return None
+    filename, chunks = upload
+    return filename, b"".join([chunk async for chunk in chunks])
+
+
+def test_streams_file_field():
+    payload = bytes(range(256)) * 40
+    assert asyncio.run(_read(_body(payload))) == ("report.pdf", payload)
+
+
+def test_missing_field_returns_none():
+    assert asyncio.run(_read(_body(b"data"), field_name="upload")) is None
@@ -14,117 +14,92 @@
 # limitations under the License.
 
 import os
-import base64
-import fitz
-from io import BytesIO
-from PIL import Image
-import requests
-from llama_index.llms.nvidia import NVIDIA #set API key
-from config import fastapi_config
-from llama_index import SimpleDirectoryReader, GPTVectorStoreIndex, LLMPredictor, ServiceContext
-from langchain import OpenAI
+import shutil
+import asyncio
+from utils import nim_client
+from utils.image_prep import prepare_image
+from utils.vlm_cache import cached_call
+from utils.layout import BlockIndex
 
 def get_b64_image_from_content(image_content):
     """Convert image content to base64 encoded string."""
-    img = Image.open(BytesIO(image_content))
-    if img.mode != 'RGB':
-        img = img.convert('RGB')
-    buffered = BytesIO()
-    img.save(buffered, format="JPEG")
-    return base64.b64encode(buffered.getvalue()).decode("utf-8")
+    return prepare_image(image_content).b64
 
 def is_graph(image_content):
     """Determine if an image is a graph, plot, chart, or table."""
-    res = describe_image(image_content)
-    return any(keyword in res.lower() for keyword in ["graph", "plot", "chart", "table"])
+    return classify_image(image_content)[1]
+
+def _mentions_graph(description):
+    return any(keyword in description.lower() for keyword in ["graph", "plot", "chart", "table"])
+
+def classify_image(image_content):
+    """Describe an image and flag whether it is a graph, in one VLM round-trip.
+
+    Returns a ``(description, is_graph)`` tuple.
+    """
+    return nim_client.run(aclassify_image(image_content))
 
 def process_graph(image_content):
     """Process a graph image and generate a description."""
-    deplot_description = process_graph_deplot(image_content)
-    mixtral = NVIDIA(model_name="meta/llama-3.1-70b-instruct")
-    response = mixtral.complete("Your responsibility is to explain charts. You are an expert in describing the responses of linearized tables into plain English text for LLMs to use. Explain the following linearized table. " + deplot_description)
-    return response.text
+    return nim_client.run(aprocess_graph(image_content))
 
 def describe_image(image_content):
     """Generate a description of an image using NVIDIA API."""
-    image_b64 = get_b64_image_from_content(image_content)
-    invoke_url = "https://ai.api.nvidia.com/v1/vlm/nvidia/neva-22b"
-    api_key = fastapi_config.NVIDIA_API_KEY
-    
-    if not api_key:
-        raise ValueError("NVIDIA API Key is not set. Please set the NVIDIA_API_KEY environment variable.")
-
-    headers = {
-        "Authorization": f"Bearer {api_key}",
-        "Accept": "application/json"
-    }
-
-    payload = {
-        "messages": [
-            {
-                "role": "user",
-                "content": f'Describe what you see in this image. <img src="data:image/png;base64,{image_b64}" />'
-            }
-        ],
-        "max_tokens": 1024,
-        "temperature": 0.20,
-        "top_p": 0.70,
-        "seed": 0,
-        "stream": False
-    }
-
-    response = requests.post(invoke_url, headers=headers, json=payload)
-    return response.json()["choices"][0]['message']['content']
+    return nim_client.run(adescribe_image(image_content))
 
 def process_graph_deplot(image_content):
     """Process a graph image using NVIDIA's Deplot API."""
-    invoke_url = "https://ai.api.nvidia.com/v1/vlm/google/deplot"
-    image_b64 = get_b64_image_from_content(image_content)
-    api_key = fastapi_config.NVIDIA_API_KEY
-    
-    if not api_key:
-        raise ValueError("NVIDIA API Key is not set. Please set the NVIDIA_API_KEY environment variable.")
-
-    headers = {
-        "Authorization": f"Bearer {api_key}",
-        "Accept": "application/json"
-    }
-
-    payload = {
-        "messages": [
-            {
-                "role": "user",
-                "content": f'Generate underlying data table of the figure below: <img src="data:image/png;base64,{image_b64}" />'
-            }
-        ],
-        "max_tokens": 1024,
-        "temperature": 0.20,
-        "top_p": 0.20,
-        "stream": False
-    }
-
-    response = requests.post(invoke_url, headers=headers, json=payload)
-    return response.json()["choices"][0]['message']['content']
+    return nim_client.run(aprocess_graph_deplot(image_content))
 
-def extract_text_around_item(text_blocks, bbox, page_height, threshold_percentage=0.1):
-    """Extract text above and below a given bounding box on a page."""
-    before_text, after_text = "", ""
-    vertical_threshold_distance = page_height * threshold_percentage
-    horizontal_threshold_distance = bbox.width * threshold_percentage
+async def _payload(prepared):
+    # JPEG encoding is CPU work, keep it off the client event loop
+    return await asyncio.to_thread(lambda: prepared.b64)
 
-    for block in text_blocks:
-        block_bbox = fitz.Rect(block[:4])
-        vertical_distance = min(abs(block_bbox.y1 - bbox.y0), abs(block_bbox.y0 - bbox.y1))
-        horizontal_overlap = max(0, min(block_bbox.x1, bbox.x1) - max(block_bbox.x0, bbox.x0))
+async def adescribe_image(image_content):
+    """Asynchronously describe an image on the shared NVIDIA client.
+
+    image_content may be raw bytes, a fitz.Pixmap or a PreparedImage.
+    """
+    prepared = prepare_image(image_content)
+
+    async def compute():
+        return await nim_client.get_client().describe_image(await _payload(prepared))
+    return await cached_call(prepared.digest, nim_client.NEVA_MODEL, nim_client.DESCRIBE_PROMPT, compute)
 
-        if vertical_distance <= vertical_threshold_distance and horizontal_overlap >= -horizontal_threshold_distance:
-            if block_bbox.y1 < bbox.y0 and not before_text:
-                before_text = block[4]
-            elif block_bbox.y0 > bbox.y1 and not after_text:
-                after_text = block[4]
-                break
+async def aprocess_graph_deplot(image_content):
+    """Asynchronously linearize a chart with Deplot on the shared NVIDIA client."""
+    prepared = prepare_image(image_content)
 
-    return before_text, after_text
+    async def compute():
+        return await nim_client.get_client().deplot(await _payload(prepared))
+    return await cached_call(prepared.digest, nim_client.DEPLOT_MODEL, nim_client.DEPLOT_PROMPT, compute)
+
+async def aprocess_graph(image_content):
+    """Asynchronously run Deplot and explain the resulting table."""
+    deplot_description = await aprocess_graph_deplot(image_content)
+    return await cached_call(deplot_description, nim_client.CHART_LLM_MODEL, nim_client.EXPLAIN_TABLE_PROMPT,
+                             lambda: nim_client.get_client().explain_table(deplot_description))
+
+async def aclassify_image(image_content):
+    """Asynchronously describe an image and flag whether it is a graph."""
+    description = await adescribe_image(image_content)
+    return description, _mentions_graph(description)
+
+def classify_images(image_contents):
+    """Classify a batch of images concurrently, see classify_image."""
+    return nim_client.gather(aclassify_image(content) for content in image_contents)
+
+def are_graphs(image_contents):
+    """Flag which images in a batch are graphs, see is_graph."""
+    return [flag for _, flag in classify_images(image_contents)]
+
+def process_graphs(image_contents):
+    """Describe a batch of graph images concurrently, see process_graph."""
+    return nim_client.gather(aprocess_graph(content) for content in image_contents)
+
+def extract_text_around_item(text_blocks, bbox, page_height, threshold_percentage=0.1):
+    """Extract text above and below a given bounding box on a page."""
+    return BlockIndex(text_blocks).text_around(bbox, page_height, threshold_percentage)
 
 def process_text_blocks(text_blocks, char_count_threshold=500):
     """Group text blocks based on a character count threshold."""
@@ -158,20 +133,10 @@ def save_uploaded_file(uploaded_file):
     """Save an uploaded file to a temporary directory."""
     temp_dir = os.path.join(os.getcwd(), "vectorstore", "ppt_references", "tmp")
     os.makedirs(temp_dir, exist_ok=True)
-    temp_file_path = os.path.join(temp_dir, uploaded_file.name)
+    temp_file_path = os.path.join(temp_dir, getattr(uploaded_file, "filename", None) or uploaded_file.name)
     
     with open(temp_file_path, "wb") as temp_file:
-        temp_file.write(uploaded_file.read())
+        shutil.copyfileobj(getattr(uploaded_file, "file", uploaded_file), temp_file)
     
     return temp_file_path
 
-
-def create_index(directory_path):
-    documents = SimpleDirectoryReader(directory_path).load_data()
-    index = GPTVectorStoreIndex.from_documents(documents)
-    return index
-
-def query_index(index, query_text):
-    query_engine = index.as_query_engine()
-    response = query_engine.query(query_text)
-    return response.response
\ No newline at end of file
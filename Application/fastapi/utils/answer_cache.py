@@ -0,0 +1,153 @@
+import re
+import threading
+import time
+from collections import OrderedDict
+import numpy as np
+from config import fastapi_config
+from utils import metrics
+
+
+def normalize_query(query):
+    """Lower-case a query and collapse its whitespace, for exact-match lookups."""
+    return re.sub(r"\s+", " ", query.strip().lower())
+
+
+class AnswerCache:
+    """In-memory cache of /query answers keyed on query embeddings.
+
+    A lookup hits when a cached query has cosine similarity of at least
+    ``threshold`` with the new one, was answered against the same index
+    version, and is younger than ``ttl`` seconds. A query whose normalized
+    text was seen before hits without being embedded at all. Answers are
+    only shared between queries with the same ``scope``, e.g. the same
+    publication filter. At most ``max_entries`` answers are kept, evicting
+    the least recently used.
+    """
+
+    def __init__(self, threshold=None, ttl=None, max_entries=None):
+        self.threshold = threshold or fastapi_config.ANSWER_CACHE_THRESHOLD
+        self.ttl = ttl or fastapi_config.ANSWER_CACHE_TTL
+        self.max_entries = max_entries or fastapi_config.ANSWER_CACHE_MAX_ENTRIES
+        self._entries = OrderedDict()
+        self._by_text = {}
+        self._matrix = None
+        self._keys = []
+        self._version = None
+        self._next_key = 0
+        self._lock = threading.Lock()
+
+    def _check_version(self, version):
+        # Any change to the index makes every cached answer suspect
+        if version != self._version:
+            if self._entries:
+                metrics.increment("answer_cache_invalidations")
+            self._entries.clear()
+            self._by_text.clear()
+            self._matrix = None
+            self._version = version
+
+    def _drop(self, key):
+        entry = self._entries.pop(key)
+        text_key = (entry["scope"], entry["text"])
+        if self._by_text.get(text_key) == key:
+            del self._by_text[text_key]
+        self._matrix = None
+
+    def _expire(self):
+        now = time.time()
+        for key in [key for key, entry in self._entries.items() if now - entry["created_at"] > self.ttl]:
+            self._drop(key)
+
+    def _hit(self, key):
+        self._entries.move_to_end(key)
+        metrics.increment("answer_cache_hits")
+        return self._entries[key]["value"]
+
+    def get_text(self, query, version, scope=()):
+        """Return the answer cached for exactly this query text, or None."""
+        with self._lock:
+            self._check_version(version)
+            self._expire()
+            key = self._by_text.get((scope, normalize_query(query)))
+            if key is None:
+                return None
+            return self._hit(key)
+
+    def get(self, query, embedding, version, scope=()):
+        """Return the answer cached for the closest similar query, or None."""
+        with self._lock:
+            self._check_version(version)
+            self._expire()
+            key = self._by_text.get((scope, normalize_query(query)))
+            if key is None and self._entries:
+                if self._matrix is None:
+                    self._keys = list(self._entries)
+                    self._matrix = np.stack([self._entries[k]["embedding"] for k in self._keys])
+                scores = self._matrix @ _unit(embedding)
+                scores[[self._entries[k]["scope"] != scope for k in self._keys]] = -np.inf
+                best = int(np.argmax(scores))
+                if scores[best] >= self.threshold:
+                    key = self._keys[best]
+            if key is None:
+                metrics.increment("answer_cache_misses")
+                return None
+            return self._hit(key)
+
+    def put(self, query, embedding, version, value, scope=()):
+        with self._lock:
+            self._check_version(version)
+            key = self._next_key
+            self._next_key += 1
+            text = normalize_query(query)
+            if (scope, text) in self._by_text:
+                self._drop(self._by_text[(scope, text)])
+            self._entries[key] = {
+                "text": text,
+                "scope": scope,
+                "embedding": _unit(embedding),
+                "value": value,
+                "created_at": time.time(),
+            }
+            self._by_text[(scope, text)] = key
+            self._matrix = None
+            while len(self._entries) > self.max_entries:
+                self._drop(next(iter(self._entries)))
+                metrics.increment("answer_cache_evictions")
+
+    def stats(self):
+        counters = metrics.snapshot()
+        hits = counters.get("answer_cache_hits", 0)
+        misses = counters.get("answer_cache_misses", 0)
+        with self._lock:
+            entries = len(self._entries)
+        return {
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": hits / (hits + misses) if hits + misses else 0.0,
+            "evictions": counters.get("answer_cache_evictions", 0),
+            "invalidations": counters.get("answer_cache_invalidations", 0),
+            "entries": entries,
+            "max_entries": self.max_entries,
+            "threshold": self.threshold,
+            "ttl": self.ttl,
+            "index_version": self._version,
+        }
+
+
+def _unit(embedding):
+    vector = np.asarray(embedding, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+_cache = None
+
+
+def get_answer_cache():
+    """Return the process-wide AnswerCache, or None when caching is disabled."""
+    global _cache
+    if not fastapi_config.ANSWER_CACHE_ENABLED:
+        return None
+    if _cache is None:
+        _cache = AnswerCache()
+    return _cache
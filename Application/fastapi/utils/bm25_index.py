@@ -0,0 +1,182 @@
+import json
+import math
+import os
+import re
+import sqlite3
+import threading
+from collections import Counter
+from llama_index.core.schema import MetadataMode, NodeWithScore, TextNode
+from config import fastapi_config
+
+STOPWORDS = frozenset(
+    "a an and are as at be by for from has have in is it its of on or that the this to was were will with".split()
+)
+# Metadata hidden from the LLM and embeddings on rows indexed before the
+# exclusion lists were stored
+LEGACY_EXCLUDED_KEYS = ["publication_id", "doc_hash", "table_num"]
+# Keeps figures such as 3.5%, 1,200 and 2024-q3 in one token
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:[.,\-][a-z0-9]+)*%?")
+
+
+def tokenize(text):
+    """Lower-case text and split it into terms, dropping stopwords."""
+    return [term for term in TOKEN_PATTERN.findall(text.lower()) if term not in STOPWORDS]
+
+
+class BM25Index:
+    """Lexical inverted index over the nodes in the vector store.
+
+    Postings, node lengths and node text live in a SQLite file next to the
+    vector store, so the index survives restarts and is updated node batch
+    by node batch as ingestion inserts or deletes documents. ``search``
+    ranks nodes with Okapi BM25.
+    """
+
+    def __init__(self, path=None, k1=None, b=None):
+        self.path = path or fastapi_config.BM25_INDEX_PATH
+        self.k1 = k1 or fastapi_config.BM25_K1
+        self.b = b if b is not None else fastapi_config.BM25_B
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(
+            "CREATE TABLE IF NOT EXISTS nodes ("
+            "node_id TEXT PRIMARY KEY, ref_doc_id TEXT, length INTEGER NOT NULL, "
+            "text TEXT NOT NULL, metadata TEXT NOT NULL, publication_id TEXT, excluded TEXT);"
+            "CREATE INDEX IF NOT EXISTS nodes_ref_doc_id ON nodes (ref_doc_id);"
+            "CREATE TABLE IF NOT EXISTS postings ("
+            "term TEXT NOT NULL, node_id TEXT NOT NULL, tf INTEGER NOT NULL, PRIMARY KEY (term, node_id)) WITHOUT ROWID;"
+            "CREATE INDEX IF NOT EXISTS postings_node_id ON postings (node_id);"
+        )
+        columns = [row[1] for row in self._conn.execute("PRAGMA table_info(nodes)")]
+        if "publication_id" not in columns:
+            # Index files written before nodes carried a publication id
+            self._conn.execute("ALTER TABLE nodes ADD COLUMN publication_id TEXT")
+        if "excluded" not in columns:
+            # ... or before the metadata exclusion lists were kept
+            self._conn.execute("ALTER TABLE nodes ADD COLUMN excluded TEXT")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS nodes_publication_id ON nodes (publication_id)")
+
+    def _remove(self, node_ids):
+        self._conn.executemany("DELETE FROM postings WHERE node_id = ?", [(node_id,) for node_id in node_ids])
+        self._conn.executemany("DELETE FROM nodes WHERE node_id = ?", [(node_id,) for node_id in node_ids])
+
+    def add_nodes(self, nodes):
+        """Index nodes, replacing any earlier version with the same node id."""
+        rows, postings = [], []
+        for node in nodes:
+            text = node.get_content(metadata_mode=MetadataMode.NONE)
+            terms = Counter(tokenize(text))
+            # Hits are rebuilt from these, so they must hide what the original node hides
+            excluded = {"embed": node.excluded_embed_metadata_keys, "llm": node.excluded_llm_metadata_keys}
+            rows.append((node.node_id, node.ref_doc_id, sum(terms.values()), text, json.dumps(node.metadata),
+                         node.metadata.get("publication_id"), json.dumps(excluded)))
+            postings.extend((term, node.node_id, tf) for term, tf in terms.items())
+        with self._lock, self._conn:
+            self._remove([row[0] for row in rows])
+            self._conn.executemany("INSERT INTO nodes VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+            self._conn.executemany("INSERT INTO postings VALUES (?, ?, ?)", postings)
+
+    def delete_ref_doc(self, ref_doc_id):
+        """Drop every node that came from the given Document."""
+        with self._lock, self._conn:
+            node_ids = [row[0] for row in self._conn.execute(
+                "SELECT node_id FROM nodes WHERE ref_doc_id = ?", (ref_doc_id,))]
+            self._remove(node_ids)
+
+    def backfill_publication_ids(self, derive):
+        """Tag nodes indexed without a publication id with derive(metadata["source"]).
+
+        Returns the number of nodes tagged; nodes derive returns None for stay untagged.
+        """
+        with self._lock, self._conn:
+            updates = []
+            for node_id, metadata, excluded in self._conn.execute(
+                    "SELECT node_id, metadata, excluded FROM nodes WHERE publication_id IS NULL").fetchall():
+                metadata = json.loads(metadata)
+                pub_id = derive(metadata.get("source"))
+                if pub_id:
+                    metadata["publication_id"] = pub_id
+                    excluded = _load_excluded(excluded)
+                    for keys in excluded.values():
+                        if "publication_id" not in keys:
+                            keys.append("publication_id")
+                    updates.append((pub_id, json.dumps(metadata), json.dumps(excluded), node_id))
+            self._conn.executemany(
+                "UPDATE nodes SET publication_id = ?, metadata = ?, excluded = ? WHERE node_id = ?", updates)
+        return len(updates)
+
+    def search(self, query, top_k=10, publication_ids=()):
+        """Return the top_k nodes for a query as NodeWithScore, best first.
+
+        With publication_ids, only nodes of those publications are scored;
+        term statistics still come from the whole collection.
+        """
+        terms = set(tokenize(query))
+        if not terms:
+            return []
+        publication_clause = ""
+        if publication_ids:
+            publication_clause = f" AND nodes.publication_id IN ({','.join('?' * len(publication_ids))})"
+        with self._lock:
+            node_count, total_length = self._conn.execute("SELECT COUNT(*), SUM(length) FROM nodes").fetchone()
+            if not node_count:
+                return []
+            avg_length = total_length / node_count
+            scores = Counter()
+            for term in terms:
+                (df,) = self._conn.execute("SELECT COUNT(*) FROM postings WHERE term = ?", (term,)).fetchone()
+                if not df:
+                    continue
+                matches = self._conn.execute(
+                    "SELECT postings.tf, nodes.length, nodes.node_id FROM postings "
+                    "JOIN nodes ON nodes.node_id = postings.node_id WHERE postings.term = ?" + publication_clause,
+                    (term, *publication_ids),
+                ).fetchall()
+                idf = math.log(1 + (node_count - df + 0.5) / (df + 0.5))
+                for tf, length, node_id in matches:
+                    norm = self.k1 * (1 - self.b + self.b * length / avg_length)
+                    scores[node_id] += idf * tf * (self.k1 + 1) / (tf + norm)
+            best = scores.most_common(top_k)
+            if not best:
+                return []
+            placeholders = ",".join("?" * len(best))
+            rows = {
+                row[0]: row for row in self._conn.execute(
+                    f"SELECT node_id, text, metadata, excluded FROM nodes WHERE node_id IN ({placeholders})",
+                    [node_id for node_id, _ in best])
+            }
+        return [NodeWithScore(node=_node_from_row(rows[node_id]), score=score) for node_id, score in best]
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM nodes").fetchone()[0]
+
+
+def _load_excluded(value):
+    if value is None:
+        return {"embed": list(LEGACY_EXCLUDED_KEYS), "llm": list(LEGACY_EXCLUDED_KEYS)}
+    return json.loads(value)
+
+
+def _node_from_row(row):
+    node_id, text, metadata, excluded = row
+    excluded = _load_excluded(excluded)
+    return TextNode(id_=node_id, text=text, metadata=json.loads(metadata),
+                    excluded_embed_metadata_keys=excluded["embed"], excluded_llm_metadata_keys=excluded["llm"])
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_lexical_index():
+    """Return the process-wide BM25Index, or None when hybrid retrieval is off."""
+    global _index
+    if fastapi_config.RETRIEVAL_MODE != "hybrid":
+        return None
+    with _index_lock:
+        if _index is None:
+            _index = BM25Index()
+    return _index
@@ -16,39 +16,177 @@
 import os
 import fitz
 from pptx import Presentation
-import subprocess
+import hashlib
+import multiprocessing
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
 from llama_index.core import Document
+from config import fastapi_config
+from utils import metrics
+from utils.image_prefilter import needs_remote_classification
+from utils.image_dedup import ImageRegistry, image_fingerprint, informative_hash
+from utils.ingest_manifest import file_digest
+from utils.table_store import save_table, table_path
+from utils.layout import BlockIndex, intersects_any
+from utils.office_pool import get_office_pool
+from utils.publications import tag_publication
 from utils import (
-    describe_image, is_graph, process_graph, extract_text_around_item, 
-    process_text_blocks, save_uploaded_file
+    describe_image, classify_images, process_graphs,
+    process_text_blocks
 )
 
-def get_pdf_documents(pdf_file):
-    """Process a PDF file and extract text, tables, and images."""
-    all_pdf_documents = []
-    ongoing_tables = {}
+_parse_pool = None
+_parse_pool_lock = threading.Lock()
+
+def get_parse_pool():
+    """Return the process-wide pool that parses and renders PDF pages, starting it on first use.
+
+    Workers come from a forkserver rather than a fork of this multithreaded
+    server, so they never inherit a lock another thread was holding.
+    """
+    global _parse_pool
+    with _parse_pool_lock:
+        if _parse_pool is None:
+            _parse_pool = ProcessPoolExecutor(max_workers=max(1, fastapi_config.PDF_PARSE_WORKERS),
+                                              mp_context=multiprocessing.get_context("forkserver"))
+    return _parse_pool
+
+def shutdown_parse_pool():
+    """Stop the parse pool's workers, if it was ever started."""
+    global _parse_pool
+    with _parse_pool_lock:
+        pool, _parse_pool = _parse_pool, None
+    if pool is not None:
+        pool.shutdown(cancel_futures=True)
+
+def iter_pdf_documents(pdf_file, num_workers=None, image_registry=None):
+    """Yield the Documents of a PDF file in page order as pages finish parsing.
+
+    The PDF is always opened by path, so MuPDF reads pages from disk on
+    demand instead of holding the whole file in memory. Uploads that do not
+    live on disk yet are first spooled to a temporary file in chunks.
+
+    Pass an ImageRegistry shared across the files of one ingestion run to
+    reuse the stored file and caption of images seen in earlier documents.
+    Without one, a registry for this document alone is used, so page ranges
+    parsed in parallel still store and describe a repeated image only once.
+    """
+    if num_workers is None:
+        num_workers = fastapi_config.PDF_PARSE_WORKERS
+    filename = getattr(pdf_file, "filename", None) or pdf_file.name
+
+    spooled_path = None
+    document_registry = None
+    if os.path.isfile(getattr(pdf_file, "name", "")):
+        source = os.path.abspath(pdf_file.name)
+        doc_hash = file_digest(source)
+    else:
+        # UploadFile wraps its SpooledTemporaryFile in .file
+        spooled_path, doc_hash = spool_to_disk(getattr(pdf_file, "file", pdf_file))
+        source = spooled_path
+    if image_registry is None:
+        image_registry = document_registry = ImageRegistry()
 
     try:
-        f = fitz.open(stream=pdf_file.read(), filetype="pdf")
-    except Exception as e:
-        print(f"Error opening or processing the PDF file: {e}")
-        return []
+        f = open_pdf(source)
+        page_count = len(f)
+
+        if num_workers <= 1 or page_count < max(2, fastapi_config.PDF_PARALLEL_MIN_PAGES):
+            try:
+                yield from iter_pdf_pages(f, filename, 0, page_count, image_registry, doc_hash)
+            finally:
+                f.close()
+            return
+        f.close()
+
+        # More ranges than workers, so early pages come back (and can be indexed)
+        # before the whole document is parsed. Workers reopen the file by path.
+        page_ranges = split_page_range(page_count, num_workers * 4)
+        executor = get_parse_pool()
+        futures = [executor.submit(parse_pdf_page_range, source, filename, start, stop, image_registry, doc_hash)
+                   for start, stop in page_ranges]
+        try:
+            # Futures are consumed in submission order so pages stay in order
+            for future in futures:
+                page_documents, worker_metrics = future.result()
+                metrics.merge(worker_metrics)
+                yield from page_documents
+        finally:
+            # A failed or abandoned document does not keep the shared pool busy
+            for future in futures:
+                future.cancel()
+    finally:
+        if spooled_path and os.path.exists(spooled_path):
+            os.remove(spooled_path)
+        if document_registry is not None:
+            document_registry.close()
+
+def spool_to_disk(fileobj, suffix=".pdf", chunk_size=1024 * 1024):
+    """Copy a file-like object to a named temporary file in chunks.
+
+    Returns the file path and the sha256 of its content.
+    """
+    digest = hashlib.sha256()
+    with tempfile.NamedTemporaryFile(suffix=suffix, delete=False) as spooled:
+        for chunk in iter(lambda: fileobj.read(chunk_size), b""):
+            digest.update(chunk)
+            spooled.write(chunk)
+    return spooled.name, digest.hexdigest()
 
-    for i in range(len(f)):
+def open_pdf(source):
+    """Open a PDF from a filesystem path or an in-memory buffer."""
+    if isinstance(source, str):
+        return fitz.open(source, filetype="pdf")
+    return fitz.open(stream=source, filetype="pdf")
+
+def split_page_range(page_count, num_chunks):
+    """Split [0, page_count) into contiguous, evenly sized (start, stop) ranges."""
+    num_chunks = max(1, min(num_chunks, page_count))
+    chunk_size, remainder = divmod(page_count, num_chunks)
+    ranges = []
+    start = 0
+    for chunk in range(num_chunks):
+        stop = start + chunk_size + (1 if chunk < remainder else 0)
+        ranges.append((start, stop))
+        start = stop
+    return ranges
+
+def parse_pdf_page_range(source, filename, start, stop, image_registry=None, doc_hash=None):
+    """Process-pool entry point: reopen the PDF and parse pages [start, stop).
+
+    Returns the Documents together with the metrics counted while parsing.
+    """
+    metrics.drain()
+    f = open_pdf(source)
+    try:
+        return parse_pdf_pages(f, filename, start, stop, image_registry, doc_hash), metrics.drain()
+    finally:
+        f.close()
+
+def parse_pdf_pages(f, filename, start, stop, image_registry=None, doc_hash=None):
+    """Extract text, table and image Documents from pages [start, stop) of an open PDF."""
+    return list(iter_pdf_pages(f, filename, start, stop, image_registry, doc_hash))
+
+def iter_pdf_pages(f, filename, start, stop, image_registry=None, doc_hash=None):
+    """Yield text, table and image Documents from pages [start, stop) of an open PDF, page by page."""
+    ongoing_tables = {}
+    seen_xrefs = {}
+
+    for i in range(start, stop):
         page = f[i]
-        text_blocks = [block for block in page.get_text("blocks", sort=True) 
-                       if block[-1] == 0 and not (block[1] < page.rect.height * 0.1 or block[3] > page.rect.height * 0.9)]
-        grouped_text_blocks = process_text_blocks(text_blocks)
+        block_index = BlockIndex.from_page(page)
+        grouped_text_blocks = process_text_blocks(block_index.blocks)
         
-        table_docs, table_bboxes, ongoing_tables = parse_all_tables(pdf_file.name, page, i, text_blocks, ongoing_tables)
-        all_pdf_documents.extend(table_docs)
+        table_docs, table_bboxes, ongoing_tables = parse_all_tables(filename, page, i, block_index, ongoing_tables, doc_hash)
+        yield from table_docs
 
-        image_docs = parse_all_images(pdf_file.name, page, i, text_blocks)
-        all_pdf_documents.extend(image_docs)
+        image_docs = parse_all_images(filename, page, i, block_index, seen_xrefs, image_registry, doc_hash)
+        yield from image_docs
 
+        heading_in_table = intersects_any([heading_block[:4] for heading_block, _ in grouped_text_blocks], table_bboxes)
         for text_block_ctr, (heading_block, content) in enumerate(grouped_text_blocks, 1):
-            heading_bbox = fitz.Rect(heading_block[:4])
-            if not any(heading_bbox.intersects(table_bbox) for table_bbox in table_bboxes):
+            if not heading_in_table[text_block_ctr - 1]:
                 bbox = {"x1": heading_block[0], "y1": heading_block[1], "x2": heading_block[2], "x3": heading_block[3]}
                 text_doc = Document(
                     text=f"{heading_block[4]}\n{content}",
@@ -56,61 +194,95 @@ def get_pdf_documents(pdf_file):
                         **bbox,
                         "type": "text",
                         "page_num": i,
-                        "source": f"{pdf_file.name[:-4]}-page{i}-block{text_block_ctr}"
+                        "source": f"{filename[:-4]}-page{i}-block{text_block_ctr}"
                     },
-                    id_=f"{pdf_file.name[:-4]}-page{i}-block{text_block_ctr}"
+                    id_=f"{filename[:-4]}-page{i}-block{text_block_ctr}"
                 )
-                all_pdf_documents.append(text_doc)
+                yield text_doc
 
-    f.close()
-    return all_pdf_documents
+def parse_all_tables(filename, page, pagenum, block_index, ongoing_tables, doc_hash=None):
+    """Extract tables from a PDF page.
 
-def parse_all_tables(filename, page, pagenum, text_blocks, ongoing_tables):
-    """Extract tables from a PDF page."""
+    block_index is the page's BlockIndex, used to find the text around each table.
+
+    Tables are stored as Parquet under the document's hash, see utils.table_store.
+    """
     table_docs = []
     table_bboxes = []
+    if doc_hash is None:
+        doc_hash = hashlib.sha256(filename.encode("utf-8")).hexdigest()
     try:
         tables = page.find_tables(horizontal_strategy="lines_strict", vertical_strategy="lines_strict")
+        pending_tables = []
         for tab in tables:
             if not tab.header.external:
                 pandas_df = tab.to_pandas()
-                tablerefdir = os.path.join(os.getcwd(), "vectorstore/table_references")
-                os.makedirs(tablerefdir, exist_ok=True)
-                df_xlsx_path = os.path.join(tablerefdir, f"table{len(table_docs)+1}-page{pagenum}.xlsx")
-                pandas_df.to_excel(df_xlsx_path)
+                table_num = len(pending_tables) + 1
+                df_path = save_table(doc_hash, pagenum, table_num, pandas_df)
                 bbox = fitz.Rect(tab.bbox)
                 table_bboxes.append(bbox)
 
-                before_text, after_text = extract_text_around_item(text_blocks, bbox, page.rect.height)
+                before_text, after_text = block_index.text_around(bbox, page.rect.height)
 
                 table_img = page.get_pixmap(clip=bbox)
-                table_img_path = os.path.join(tablerefdir, f"table{len(table_docs)+1}-page{pagenum}.jpg")
+                table_img_path = table_path(doc_hash, pagenum, table_num, "jpg")
                 table_img.save(table_img_path)
-                description = process_graph(table_img.tobytes())
-
-                caption = before_text.replace("\n", " ") + description + after_text.replace("\n", " ")
-                if before_text == "" and after_text == "":
-                    caption = " ".join(tab.header.names)
-                table_metadata = {
-                    "source": f"{filename[:-4]}-page{pagenum}-table{len(table_docs)+1}",
-                    "dataframe": df_xlsx_path,
-                    "image": table_img_path,
-                    "caption": caption,
-                    "type": "table",
-                    "page_num": pagenum
-                }
-                all_cols = ", ".join(list(pandas_df.columns.values))
-                doc = Document(text=f"This is a table with the caption: {caption}\nThe columns are {all_cols}", metadata=table_metadata)
-                table_docs.append(doc)
+                pending_tables.append((tab, pandas_df, df_path, table_img_path, table_img, before_text, after_text))
+
+        # Describe every table on the page concurrently, straight from the pixmaps
+        descriptions = process_graphs([pending[4] for pending in pending_tables])
+
+        for table_num, (pending, description) in enumerate(zip(pending_tables, descriptions), 1):
+            tab, pandas_df, df_path, table_img_path, _, before_text, after_text = pending
+            caption = before_text.replace("\n", " ") + description + after_text.replace("\n", " ")
+            if before_text == "" and after_text == "":
+                caption = " ".join(tab.header.names)
+            table_metadata = {
+                "source": f"{filename[:-4]}-page{pagenum}-table{table_num}",
+                "dataframe": df_path,
+                "image": table_img_path,
+                "caption": caption,
+                "type": "table",
+                "page_num": pagenum,
+                "table_num": table_num,
+                "doc_hash": doc_hash
+            }
+            all_cols = ", ".join(list(pandas_df.columns.values))
+            # Bookkeeping for the table store, not content to embed or show the LLM
+            bookkeeping_keys = ["table_num", "doc_hash"]
+            doc = Document(text=f"This is a table with the caption: {caption}\nThe columns are {all_cols}", metadata=table_metadata,
+                           excluded_embed_metadata_keys=list(bookkeeping_keys),
+                           excluded_llm_metadata_keys=list(bookkeeping_keys))
+            table_docs.append(doc)
     except Exception as e:
         print(f"Error during table extraction: {e}")
     return table_docs, table_bboxes, ongoing_tables
 
-def parse_all_images(filename, page, pagenum, text_blocks):
-    """Extract images from a PDF page."""
+def parse_all_images(filename, page, pagenum, block_index, seen_xrefs=None, image_registry=None, doc_hash=None):
+    """Extract images from a PDF page.
+
+    block_index is the page's BlockIndex, used to find the text around each image.
+
+    seen_xrefs maps xrefs already handled in this document to their
+    (image_path, description). Repeats of those, and images in
+    image_registry that look the same (see ImageRegistry), reuse the
+    stored file and caption instead of being written and described again.
+    Images another page range is describing at the same time are waited
+    for once the page's own new images are described.
+    Images are stored under the document's hash, since xrefs and page
+    numbers repeat across documents.
+    """
     image_docs = []
     image_info_list = page.get_image_info(xrefs=True)
     page_rect = page.rect
+    if seen_xrefs is None:
+        seen_xrefs = {}
+    if doc_hash is None:
+        doc_hash = hashlib.sha256(filename.encode("utf-8")).hexdigest()
+    # (xref, before_text, after_text) for every image that becomes a Document
+    placements = []
+    # xref -> (image_data, fingerprint) for images not handled in this document yet
+    unseen = {}
 
     for image_info in image_info_list:
         xref = image_info['xref']
@@ -121,22 +293,77 @@ def parse_all_images(filename, page, pagenum, text_blocks):
         if img_bbox.width < page_rect.width / 20 or img_bbox.height < page_rect.height / 20:
             continue
 
-        extracted_image = page.parent.extract_image(xref)
-        image_data = extracted_image["image"]
-        imgrefpath = os.path.join(os.getcwd(), "vectorstore/image_references")
-        os.makedirs(imgrefpath, exist_ok=True)
-        image_path = os.path.join(imgrefpath, f"image{xref}-page{pagenum}.png")
-        with open(image_path, "wb") as img_file:
-            img_file.write(image_data)
-
-        before_text, after_text = extract_text_around_item(text_blocks, img_bbox, page.rect.height)
+        before_text, after_text = block_index.text_around(img_bbox, page.rect.height)
         if before_text == "" and after_text == "":
             continue
+        placements.append((xref, before_text, after_text))
+        if xref in seen_xrefs or xref in unseen:
+            metrics.increment("images_deduplicated")
+            continue
 
-        image_description = " "
-        if is_graph(image_data):
-            image_description = process_graph(image_data)
+        image_data = page.parent.extract_image(xref)["image"]
+        fingerprint = None
+        if image_registry is not None:
+            try:
+                phash, thumbnail = image_fingerprint(image_data)
+                # Blank and flat images carry no identity worth sharing across documents
+                if informative_hash(phash):
+                    fingerprint = (phash, thumbnail)
+            except Exception as e:
+                print(f"Error hashing image {xref}: {e}")
+        unseen[xref] = (image_data, fingerprint)
+
+    def describe(images, claims):
+        # Store and describe {xref: image_data} together, then hand the claimed
+        # ones ({image_id: xref}) to the registry, or give them up on failure
+        try:
+            image_paths = {xref: save_image(doc_hash, xref, pagenum, image_data) for xref, image_data in images.items()}
+            image_descriptions = describe_pending_images(list(images.values()))
+        except Exception:
+            for image_id in claims:
+                image_registry.release(image_id)
+            raise
+        for (xref, image_path), image_description in zip(image_paths.items(), image_descriptions):
+            seen_xrefs[xref] = (image_path, image_description)
+        for image_id, xref in claims.items():
+            image_registry.record(image_id, *seen_xrefs[xref])
 
+    # Claim without waiting first, so every image nobody else is describing
+    # is classified and described with the rest of the page
+    new_images, claims, aliases, deferred = {}, {}, {}, []
+    for xref, (image_data, fingerprint) in unseen.items():
+        if fingerprint is not None:
+            image_id, known_image = image_registry.claim(*fingerprint, timeout=0)
+            if known_image is not None or image_id in claims:
+                if known_image is not None:
+                    seen_xrefs[xref] = tuple(known_image)
+                else:
+                    # The same picture under another xref on this page
+                    aliases[xref] = claims[image_id]
+                metrics.increment("images_deduplicated")
+                continue
+            if image_id is None:
+                # Being described by a parser working on other pages
+                deferred.append(xref)
+                continue
+            claims[image_id] = xref
+        new_images[xref] = image_data
+    describe(new_images, claims)
+    for xref, original in aliases.items():
+        seen_xrefs[xref] = seen_xrefs[original]
+
+    # Then wait for the others' descriptions, holding no claims while waiting
+    for xref in deferred:
+        image_data, fingerprint = unseen[xref]
+        image_id, known_image = image_registry.claim(*fingerprint)
+        if known_image is not None:
+            seen_xrefs[xref] = tuple(known_image)
+            metrics.increment("images_deduplicated")
+            continue
+        describe({xref: image_data}, {image_id: xref} if image_id is not None else {})
+
+    for xref, before_text, after_text in placements:
+        image_path, image_description = seen_xrefs[xref]
         caption = before_text.replace("\n", " ") + image_description + after_text.replace("\n", " ")
 
         image_metadata = {
@@ -149,24 +376,50 @@ def parse_all_images(filename, page, pagenum, text_blocks):
         image_docs.append(Document(text="This is an image with the caption: " + caption, metadata=image_metadata))
     return image_docs
 
+def save_image(doc_hash, xref, pagenum, image_data):
+    """Write an extracted PDF image under its document's hash and return the path."""
+    imgrefpath = os.path.join(os.getcwd(), "vectorstore/image_references", doc_hash)
+    os.makedirs(imgrefpath, exist_ok=True)
+    image_path = os.path.join(imgrefpath, f"image{xref}-page{pagenum}.png")
+    with open(image_path, "wb") as img_file:
+        img_file.write(image_data)
+    return image_path
+
+def describe_pending_images(image_contents):
+    """Return a caption fragment for each image.
+
+    Images the local pre-filter rules out as charts get no remote calls at
+    all. The rest are described once by the VLM; graphs are then linearized
+    and explained, and everything else keeps the VLM description it got.
+    """
+    remote_indices = [idx for idx, content in enumerate(image_contents) if needs_remote_classification(content)]
+    classifications = classify_images([image_contents[idx] for idx in remote_indices])
+    graph_data = [image_contents[idx] for idx, (_, flag) in zip(remote_indices, classifications) if flag]
+    graph_descriptions = iter(process_graphs(graph_data))
+
+    image_descriptions = [" "] * len(image_contents)
+    for idx, (description, flag) in zip(remote_indices, classifications):
+        image_descriptions[idx] = next(graph_descriptions) if flag else f" {description} "
+    return image_descriptions
+
 def process_ppt_file(ppt_path):
     """Process a PowerPoint file."""
     pdf_path = convert_ppt_to_pdf(ppt_path)
-    images_data = convert_pdf_to_images(pdf_path)
+    save_dir = os.path.join(os.getcwd(), "vectorstore/ppt_references") if fastapi_config.SLIDE_SAVE_IMAGES else None
+    # Slides are rendered straight to memory; the PNGs on disk are only a side output
+    slide_images = list(iter_pdf_page_images(pdf_path, save_dir=save_dir))
     slide_texts = extract_text_and_notes_from_ppt(ppt_path)
     processed_data = []
 
-    for (image_path, page_num), (slide_text, notes) in zip(images_data, slide_texts):
+    slides = list(zip(slide_images, slide_texts))
+
+    # Classify every slide together, then describe the graphs together
+    image_descriptions = describe_pending_images([image_content for (_, image_content, _), _ in slides])
+
+    for ((page_num, _, image_path), (slide_text, notes)), image_description in zip(slides, image_descriptions):
         if notes:
             notes = "\n\nThe speaker notes for this slide are: " + notes
         
-        with open(image_path, 'rb') as image_file:
-            image_content = image_file.read()
-        
-        image_description = " "
-        if is_graph(image_content):
-            image_description = process_graph(image_content)
-        
         image_metadata = {
             "source": f"{os.path.basename(ppt_path)}",
             "image": image_path,
@@ -179,33 +432,56 @@ def process_ppt_file(ppt_path):
     return processed_data
 
 def convert_ppt_to_pdf(ppt_path):
-    """Convert a PowerPoint file to PDF using LibreOffice."""
-    base_name = os.path.basename(ppt_path)
-    ppt_name_without_ext = os.path.splitext(base_name)[0].replace(' ', '_')
+    """Convert a PowerPoint file to PDF on the shared LibreOffice worker pool."""
     new_dir_path = os.path.abspath("vectorstore/ppt_references")
-    os.makedirs(new_dir_path, exist_ok=True)
-    pdf_path = os.path.join(new_dir_path, f"{ppt_name_without_ext}.pdf")
-    command = ['libreoffice', '--headless', '--convert-to', 'pdf', '--outdir', new_dir_path, ppt_path]
-    subprocess.run(command, check=True)
-    return pdf_path
-
-def convert_pdf_to_images(pdf_path):
-    """Convert a PDF file to a series of images using PyMuPDF."""
-    doc = fitz.open(pdf_path)
-    base_name = os.path.basename(pdf_path)
-    pdf_name_without_ext = os.path.splitext(base_name)[0].replace(' ', '_')
-    new_dir_path = os.path.join(os.getcwd(), "vectorstore/ppt_references")
-    os.makedirs(new_dir_path, exist_ok=True)
-    image_paths = []
-
-    for page_num in range(len(doc)):
-        page = doc.load_page(page_num)
-        pix = page.get_pixmap()
-        output_image_path = os.path.join(new_dir_path, f"{pdf_name_without_ext}_{page_num:04d}.png")
-        pix.save(output_image_path)
-        image_paths.append((output_image_path, page_num))
-    doc.close()
-    return image_paths
+    return get_office_pool().convert(ppt_path, new_dir_path)
+
+def iter_pdf_page_images(pdf_path, dpi=None, image_format=None, num_workers=None, save_dir=None):
+    """Render the pages of a PDF to encoded images in memory, in page order.
+
+    Yields (page_num, image_bytes, image_path) tuples. Pages are rendered at
+    dpi in image_format ("png" or "jpg") across worker processes for longer
+    documents. image_path is None unless save_dir is given, in which case the
+    already encoded bytes are also written there.
+    """
+    dpi = dpi or fastapi_config.SLIDE_RENDER_DPI
+    image_format = image_format or fastapi_config.SLIDE_RENDER_FORMAT
+    if num_workers is None:
+        num_workers = fastapi_config.PDF_PARSE_WORKERS
+    if save_dir:
+        os.makedirs(save_dir, exist_ok=True)
+
+    with fitz.open(pdf_path) as doc:
+        page_count = len(doc)
+    if num_workers <= 1 or page_count < max(2, fastapi_config.PDF_PARALLEL_MIN_PAGES):
+        yield from render_pdf_page_range(pdf_path, 0, page_count, dpi, image_format, save_dir)
+        return
+
+    page_ranges = split_page_range(page_count, num_workers)
+    futures = [get_parse_pool().submit(render_pdf_page_range, pdf_path, start, stop, dpi, image_format, save_dir)
+               for start, stop in page_ranges]
+    try:
+        for future in futures:
+            yield from future.result()
+    finally:
+        for future in futures:
+            future.cancel()
+
+def render_pdf_page_range(pdf_path, start, stop, dpi, image_format, save_dir=None):
+    """Process-pool entry point: render pages [start, stop) of a PDF, see iter_pdf_page_images."""
+    pdf_name_without_ext = os.path.splitext(os.path.basename(pdf_path))[0].replace(' ', '_')
+    rendered = []
+    with fitz.open(pdf_path) as doc:
+        for page_num in range(start, stop):
+            pix = doc.load_page(page_num).get_pixmap(dpi=dpi)
+            image_content = pix.tobytes(output=image_format)
+            output_image_path = None
+            if save_dir:
+                output_image_path = os.path.join(save_dir, f"{pdf_name_without_ext}_{page_num:04d}.{image_format}")
+                with open(output_image_path, "wb") as image_file:
+                    image_file.write(image_content)
+            rendered.append((page_num, image_content, output_image_path))
+    return rendered
 
 def extract_text_and_notes_from_ppt(ppt_path):
     """Extract text and notes from a PowerPoint file."""
@@ -220,65 +496,31 @@ def extract_text_and_notes_from_ppt(ppt_path):
         text_and_notes.append((slide_text, notes))
     return text_and_notes
 
-def load_multimodal_data(files):
-    """Load and process multiple file types."""
-    documents = []
-    for file in files:
-        file_extension = os.path.splitext(file.filename.lower())[1]
-        if file_extension in ('.png', '.jpg', '.jpeg'):
-            image_content = file.read()
-            image_text = describe_image(image_content)
-            doc = Document(text=image_text, metadata={"source": file.name, "type": "image"})
-            documents.append(doc)
-        elif file_extension == '.pdf':
-            try:
-                pdf_documents = get_pdf_documents(file)
-                documents.extend(pdf_documents)
-            except Exception as e:
-                print(f"Error processing PDF {file.name}: {e}")
-        elif file_extension in ('.ppt', '.pptx'):
-            try:
-                ppt_documents = process_ppt_file(save_uploaded_file(file))
-                documents.extend(ppt_documents)
-            except Exception as e:
-                print(f"Error processing PPT {file.name}: {e}")
-        else:
-            text = file.read().decode("utf-8")
-            doc = Document(text=text, metadata={"source": file.name, "type": "text"})
-            documents.append(doc)
-    return documents
-
-def load_data_from_directory(directory):
-    """Load and process multiple file types from a directory."""
-    documents = []
-    for filename in os.listdir(directory):
-        filepath = os.path.join(directory, filename)
-        file_extension = os.path.splitext(filename.lower())[1]
-        print(filename)
-        if file_extension in ('.png', '.jpg', '.jpeg'):
-            with open(filepath, "rb") as image_file:
-                image_content = image_file.read()
-            image_text = describe_image(image_content)
-            doc = Document(text=image_text, metadata={"source": filename, "type": "image"})
-            print(doc)
-            documents.append(doc)
-        elif file_extension == '.pdf':
-            with open(filepath, "rb") as pdf_file:
-                try:
-                    pdf_documents = get_pdf_documents(pdf_file)
-                    documents.extend(pdf_documents)
-                except Exception as e:
-                    print(f"Error processing PDF {filename}: {e}")
-        elif file_extension in ('.ppt', '.pptx'):
-            try:
-                ppt_documents = process_ppt_file(filepath)
-                documents.extend(ppt_documents)
-                print(ppt_documents)
-            except Exception as e:
-                print(f"Error processing PPT {filename}: {e}")
-        else:
-            with open(filepath, "r", encoding="utf-8") as text_file:
-                text = text_file.read()
-            doc = Document(text=text, metadata={"source": filename, "type": "text"})
-            documents.append(doc)
-    return documents
\ No newline at end of file
+def iter_data_from_file(filepath, image_registry=None):
+    """Yield Documents for a single file on disk as they are produced, tagged with its publication id."""
+    return tag_publication(_iter_file_documents(filepath, image_registry), filepath)
+
+def _iter_file_documents(filepath, image_registry=None):
+    filename = os.path.basename(filepath)
+    file_extension = os.path.splitext(filename.lower())[1]
+    print(filename)
+    if file_extension in ('.png', '.jpg', '.jpeg'):
+        with open(filepath, "rb") as image_file:
+            image_content = image_file.read()
+        image_text = describe_image(image_content)
+        doc = Document(text=image_text, metadata={"source": filename, "type": "image"})
+        print(doc)
+        yield doc
+    elif file_extension == '.pdf':
+        # Parse errors propagate, so a broken file fails its ingestion
+        # instead of being recorded as ingested with no Documents
+        with open(filepath, "rb") as pdf_file:
+            yield from iter_pdf_documents(pdf_file, image_registry=image_registry)
+    elif file_extension in ('.ppt', '.pptx'):
+        ppt_documents = process_ppt_file(filepath)
+        print(ppt_documents)
+        yield from ppt_documents
+    else:
+        with open(filepath, "r", encoding="utf-8") as text_file:
+            text = text_file.read()
+        yield Document(text=text, metadata={"source": filename, "type": "text"})
@@ -0,0 +1,107 @@
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from llama_index.core import Settings
+from llama_index.core.schema import MetadataMode
+from config import fastapi_config
+from utils import metrics
+
+
+def is_rate_limited(error):
+    """Return True if an embedding request failed with HTTP 429."""
+    status = getattr(error, "status_code", None) or getattr(getattr(error, "response", None), "status_code", None)
+    return status == 429 or "429" in str(error)
+
+
+class BatchEmbedder:
+    """Embed nodes in concurrent batches whose size adapts to the endpoint.
+
+    Up to ``max_in_flight`` batch requests run at once. The batch size grows
+    while requests return within ``target_latency`` seconds, shrinks when
+    they are slower, and halves on a 429, after which the rejected nodes are
+    retried with exponential backoff. The batch size carries over between
+    calls, so a long-lived embedder settles on what the endpoint sustains.
+    """
+
+    def __init__(self, embed_model=None, batch_size=None, min_batch_size=1, max_batch_size=None,
+                 max_in_flight=None, target_latency=None, max_retries=6):
+        self.embed_model = embed_model
+        self.batch_size = batch_size or fastapi_config.EMBED_BATCH_SIZE
+        self.min_batch_size = min_batch_size
+        self.max_batch_size = max_batch_size or fastapi_config.EMBED_MAX_BATCH_SIZE
+        self.max_in_flight = max_in_flight or fastapi_config.EMBED_MAX_IN_FLIGHT
+        self.target_latency = target_latency or fastapi_config.EMBED_TARGET_LATENCY
+        self.max_retries = max_retries
+        self._lock = threading.Lock()
+
+    def _embed_batch(self, texts):
+        embed_model = self.embed_model or Settings.embed_model
+        started = time.perf_counter()
+        embeddings = embed_model.get_text_embedding_batch(texts)
+        return embeddings, time.perf_counter() - started
+
+    def _adapt(self, latency=None, rate_limited=False):
+        with self._lock:
+            if rate_limited:
+                self.batch_size = max(self.min_batch_size, self.batch_size // 2)
+            elif latency > self.target_latency:
+                self.batch_size = max(self.min_batch_size, int(self.batch_size * 0.75))
+            elif latency < self.target_latency / 2:
+                self.batch_size = min(self.max_batch_size, self.batch_size + max(1, self.batch_size // 4))
+
+    def embed_nodes(self, nodes):
+        """Set ``node.embedding`` on every node that does not have one yet and return the nodes."""
+        pending = deque(node for node in nodes if node.embedding is None)
+        if not pending:
+            return nodes
+        embedded = 0
+        started = time.perf_counter()
+
+        with ThreadPoolExecutor(max_workers=self.max_in_flight) as executor:
+            in_flight = {}
+            while pending or in_flight:
+                while pending and len(in_flight) < self.max_in_flight:
+                    batch = [pending.popleft() for _ in range(min(self.batch_size, len(pending)))]
+                    texts = [node.get_content(metadata_mode=MetadataMode.EMBED) for node in batch]
+                    in_flight[executor.submit(self._embed_batch, texts)] = (batch, 0)
+
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    batch, attempt = in_flight.pop(future)
+                    try:
+                        embeddings, latency = future.result()
+                    except Exception as e:
+                        if not is_rate_limited(e) or attempt >= self.max_retries:
+                            raise
+                        metrics.increment("embedding_rate_limited")
+                        self._adapt(rate_limited=True)
+                        time.sleep(min(30, 0.5 * 2 ** attempt))
+                        # Retry the rejected nodes in batches of the reduced size
+                        for offset in range(0, len(batch), self.batch_size):
+                            retry = batch[offset:offset + self.batch_size]
+                            texts = [node.get_content(metadata_mode=MetadataMode.EMBED) for node in retry]
+                            in_flight[executor.submit(self._embed_batch, texts)] = (retry, attempt + 1)
+                        continue
+                    for node, embedding in zip(batch, embeddings):
+                        node.embedding = embedding
+                    embedded += len(batch)
+                    self._adapt(latency=latency)
+
+        elapsed = time.perf_counter() - started
+        metrics.increment("embedded_nodes", embedded)
+        metrics.increment("embedding_seconds", elapsed)
+        print(f"Embedded {embedded} nodes in {elapsed:.2f}s "
+              f"({embedded / elapsed if elapsed else 0:.1f} nodes/s, batch size now {self.batch_size})")
+        return nodes
+
+
+_embedder = None
+
+
+def get_embedder():
+    """Return the process-wide BatchEmbedder."""
+    global _embedder
+    if _embedder is None:
+        _embedder = BatchEmbedder()
+    return _embedder
@@ -0,0 +1,187 @@
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from io import BytesIO
+import numpy as np
+from PIL import Image
+from config import fastapi_config
+
+# Side of the grayscale thumbnail that confirms a dHash match pixel by pixel
+THUMBNAIL_SIZE = 32
+# A confirmed match has at most this share of thumbnail pixels off by more
+# than PIXEL_TOLERANCE gray levels: enough for rescaling and recompression,
+# not for a bar or line that moved
+MAX_CHANGED_PIXELS = 0.005
+PIXEL_TOLERANCE = 32
+# How long claim() waits for another parser to describe a matching image
+CLAIM_TIMEOUT = 300
+CLAIM_POLL_INTERVAL = 0.1
+
+
+def image_fingerprint(image_content, hash_size=8):
+    """Return the 64-bit difference hash (dHash) of an image and a small grayscale thumbnail.
+
+    Re-encoded, rescaled or slightly recompressed copies of the same figure
+    get the same or a nearby dHash and nearly the same thumbnail bytes.
+    """
+    img = Image.open(BytesIO(image_content))
+    img.draft("L", (THUMBNAIL_SIZE * 4, THUMBNAIL_SIZE * 4))
+    img = img.convert("L")
+    pixels = np.asarray(img.resize((hash_size + 1, hash_size), Image.LANCZOS), dtype=np.int16)
+    bits = (pixels[:, 1:] > pixels[:, :-1]).ravel()
+    phash = int(np.packbits(bits).view('>u8')[0])
+    thumbnail = img.resize((THUMBNAIL_SIZE, THUMBNAIL_SIZE), Image.LANCZOS).tobytes()
+    return phash, thumbnail
+
+
+def informative_hash(phash, min_bits=8):
+    """Whether a dHash has enough structure to tell images apart.
+
+    Flat, blank and plain gradient images hash to (nearly) all zeros or
+    all ones, so any two of them would look like the same image.
+    """
+    ones = bin(phash).count("1")
+    return min_bits <= ones <= 64 - min_bits
+
+
+def thumbnails_match(first, second):
+    """Whether two image_fingerprint thumbnails show the same picture."""
+    first = np.frombuffer(first, dtype=np.uint8).astype(np.int16)
+    second = np.frombuffer(second, dtype=np.uint8).astype(np.int16)
+    if first.shape != second.shape:
+        return False
+    return (np.abs(first - second) > PIXEL_TOLERANCE).mean() <= MAX_CHANGED_PIXELS
+
+
+def _bands(phash, count):
+    # Split the 64 hash bits into count bands. Two hashes within count - 1
+    # bits of each other agree exactly on at least one band.
+    bounds = [64 * band // count for band in range(count + 1)]
+    return [(band, (phash >> low) & ((1 << (high - low)) - 1))
+            for band, (low, high) in enumerate(zip(bounds, bounds[1:]))]
+
+
+class ImageRegistry:
+    """Images already stored and described during one ingestion run.
+
+    An image matches a registered one when their dHashes differ in at most
+    ``max_distance`` bits and their thumbnails agree pixel by pixel, so
+    rescaled or recompressed copies are reused while two different charts
+    that share a layout, and so a dHash, are not. Candidates are found
+    through exact matches on bands of the hash rather than a full scan.
+
+    Parsers running at the same time ``claim`` an image before describing
+    it, so only one of them calls the VLM and the others wait for its
+    description instead of racing it.
+
+    Backed by a SQLite file so parse worker processes share it; pickling a
+    registry only carries the file path and each process, and each thread,
+    connects lazily.
+    """
+
+    def __init__(self, path=None, max_distance=None):
+        if path is None:
+            fd, path = tempfile.mkstemp(prefix="image-registry-", suffix=".sqlite3")
+            os.close(fd)
+        self.path = path
+        self.max_distance = fastapi_config.IMAGE_DEDUP_MAX_DISTANCE if max_distance is None else max_distance
+        self._local = threading.local()
+
+    def __getstate__(self):
+        return {"path": self.path, "max_distance": self.max_distance}
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._local = threading.local()
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.executescript(
+                "CREATE TABLE IF NOT EXISTS images (id INTEGER PRIMARY KEY, phash TEXT NOT NULL, "
+                "thumbnail BLOB NOT NULL, owner TEXT NOT NULL, image_path TEXT, description TEXT);"
+                "CREATE TABLE IF NOT EXISTS bands (band INTEGER NOT NULL, value INTEGER NOT NULL, "
+                "image_id INTEGER NOT NULL, PRIMARY KEY (band, value, image_id)) WITHOUT ROWID;"
+            )
+        return conn
+
+    def _match(self, phash, thumbnail):
+        bands = _bands(phash, self.max_distance + 1)
+        candidates = self._connection().execute(
+            "SELECT DISTINCT images.id, images.phash, images.thumbnail, images.owner, images.image_path, "
+            "images.description FROM bands JOIN images ON images.id = bands.image_id WHERE "
+            + " OR ".join("(bands.band = ? AND bands.value = ?)" for _ in bands) + " ORDER BY images.id",
+            [value for band in bands for value in band],
+        ).fetchall()
+        for image_id, known_hash, known_thumbnail, owner, image_path, description in candidates:
+            if bin(phash ^ int(known_hash, 16)).count("1") <= self.max_distance \
+                    and thumbnails_match(thumbnail, known_thumbnail):
+                return image_id, owner, image_path, description
+        return None
+
+    def claim(self, phash, thumbnail, timeout=CLAIM_TIMEOUT):
+        """Find an image, or reserve it for the caller to describe.
+
+        Returns (image_id, known). known is (image_path, description) when a
+        matching image was already described. Otherwise the caller holds
+        image_id and must record() or release() it; an image_id the caller
+        already holds means a repeat of an image it is still describing.
+        Images another thread or process is describing are waited for, and
+        after timeout seconds (image_id None) the caller describes its own copy.
+        Callers must not wait while holding claims, or two of them can end up
+        waiting on each other.
+        """
+        owner = f"{os.getpid()}-{threading.get_ident()}"
+        deadline = time.monotonic() + timeout
+        conn = self._connection()
+        while True:
+            with conn:
+                # Taking the write lock first makes the lookup and the insert atomic
+                conn.execute("BEGIN IMMEDIATE")
+                match = self._match(phash, thumbnail)
+                if match is None:
+                    image_id = conn.execute("INSERT INTO images (phash, thumbnail, owner) VALUES (?, ?, ?)",
+                                            (f"{phash:016x}", thumbnail, owner)).lastrowid
+                    conn.executemany("INSERT INTO bands (band, value, image_id) VALUES (?, ?, ?)",
+                                     [(band, value, image_id) for band, value in _bands(phash, self.max_distance + 1)])
+                    return image_id, None
+            image_id, match_owner, image_path, description = match
+            if description is not None:
+                return image_id, (image_path, description)
+            if match_owner == owner:
+                return image_id, None
+            if time.monotonic() >= deadline:
+                return None, None
+            time.sleep(CLAIM_POLL_INTERVAL)
+
+    def record(self, image_id, image_path, description):
+        """Store where a claimed image was saved and how it was described."""
+        with self._connection() as conn:
+            conn.execute("UPDATE images SET image_path = ?, description = ? WHERE id = ?",
+                         (image_path, description, image_id))
+
+    def release(self, image_id):
+        """Give up a claim without describing the image, so others may claim it."""
+        conn = self._connection()
+        with conn:
+            conn.execute("BEGIN")
+            conn.execute("DELETE FROM bands WHERE image_id = ?", (image_id,))
+            conn.execute("DELETE FROM images WHERE id = ?", (image_id,))
+
+    def close(self):
+        """Close the connection and delete the backing file."""
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,89 @@
+from io import BytesIO
+import numpy as np
+from PIL import Image
+from config import fastapi_config
+from utils import metrics
+
+
+def image_statistics(image_content, sample_edge=256, line_edge=1024):
+    """Compute cheap layout statistics for an image on downsampled copies.
+
+    Returns a dict with:
+      palette_size  - number of 12-bit colors that each cover at least 0.1% of the pixels
+      whitespace    - share of near-white pixels
+      edge_density  - share of pixels with a strong horizontal or vertical gradient
+      line_density  - share of rows and columns that contain a long straight edge run
+
+    Colors are counted on a copy of up to sample_edge pixels per side, while
+    edges and lines come from a copy of up to line_edge pixels, since
+    shrinking further blurs 1 px gridlines into the background.
+    """
+    img = Image.open(BytesIO(image_content))
+    img.draft("RGB", (line_edge, line_edge))
+    img = img.convert("RGB")
+    img.thumbnail((line_edge, line_edge))
+    sample = img.copy()
+    sample.thumbnail((sample_edge, sample_edge))
+    pixels = np.asarray(sample, dtype=np.uint8)
+    quantized = (pixels >> 4).astype(np.uint16)
+    codes = (quantized[..., 0] << 8) | (quantized[..., 1] << 4) | quantized[..., 2]
+    color_counts = np.bincount(codes.ravel(), minlength=4096)
+    palette_size = int(np.count_nonzero(color_counts >= 0.001 * codes.size))
+
+    whitespace = float((pixels.mean(axis=2) > 240).mean())
+
+    gray = np.asarray(img.convert("L"), dtype=np.int16)
+    horizontal_steps = np.abs(np.diff(gray, axis=0))
+    vertical_steps = np.abs(np.diff(gray, axis=1))
+    edge_density = float(((horizontal_steps > 48).mean() + (vertical_steps > 48).mean()) / 2)
+
+    # Axes, gridlines and table rules show up as rows/columns where most of the
+    # pixels sit on the same edge. The lower threshold keeps faint gridlines on
+    # dark chart backgrounds; runs are counted per row/column of the small
+    # sample so the density does not depend on the image size.
+    long_rows = _pool((horizontal_steps > 24).mean(axis=1) > 0.3, pixels.shape[0] - 1)
+    long_cols = _pool((vertical_steps > 24).mean(axis=0) > 0.3, pixels.shape[1] - 1)
+    line_count = int(long_rows.sum() + long_cols.sum())
+    line_density = line_count / max(1, len(long_rows) + len(long_cols))
+
+    return {
+        "palette_size": palette_size,
+        "whitespace": whitespace,
+        "edge_density": edge_density,
+        "line_density": line_density,
+    }
+
+
+def _pool(flags, size):
+    # Shrink a row/column mask to size bins, a bin being set if any of its entries is
+    pooled = np.zeros(max(1, size), dtype=bool)
+    np.logical_or.at(pooled, np.arange(len(flags)) * len(pooled) // max(1, len(flags)), flags)
+    return pooled
+
+
+def is_likely_graph(stats, max_palette=None, min_whitespace=None, min_line_density=None, max_edge_density=None):
+    """Decide from image_statistics output whether an image could be a chart or table."""
+    max_palette = fastapi_config.PREFILTER_MAX_PALETTE if max_palette is None else max_palette
+    min_whitespace = fastapi_config.PREFILTER_MIN_WHITESPACE if min_whitespace is None else min_whitespace
+    min_line_density = fastapi_config.PREFILTER_MIN_LINE_DENSITY if min_line_density is None else min_line_density
+    max_edge_density = fastapi_config.PREFILTER_MAX_EDGE_DENSITY if max_edge_density is None else max_edge_density
+
+    # Photographs and decorative art use a wide palette and little background,
+    # and grayscale or grainy ones give themselves away by edges everywhere
+    if stats["palette_size"] > max_palette or stats["edge_density"] > max_edge_density:
+        return False
+    return stats["whitespace"] >= min_whitespace or stats["line_density"] >= min_line_density
+
+
+def needs_remote_classification(image_content):
+    """Return False only for images that are confidently not charts or tables."""
+    if not fastapi_config.PREFILTER_ENABLED:
+        return True
+    try:
+        likely_graph = is_likely_graph(image_statistics(image_content))
+    except Exception as e:
+        # Formats PIL cannot decode go to the remote model as before
+        print(f"Error computing image statistics: {e}")
+        return True
+    metrics.increment("prefilter_passed" if likely_graph else "prefilter_bypassed")
+    return likely_graph
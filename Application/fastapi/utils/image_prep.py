@@ -0,0 +1,82 @@
+import base64
+import hashlib
+import threading
+from collections import OrderedDict
+from io import BytesIO
+from PIL import Image
+from config import fastapi_config
+
+
+class PreparedImage:
+    """An image readied once for every model call that needs it.
+
+    ``digest`` identifies the source pixels and is cheap to compute. The
+    downscaled JPEG payload (``b64``) is encoded on first access and then
+    reused, so describing, classifying and linearizing the same image only
+    decodes and encodes it once.
+    """
+
+    def __init__(self, source, digest, max_edge, quality):
+        self._source = source
+        self.digest = digest
+        self.max_edge = max_edge
+        self.quality = quality
+        self._b64 = None
+        self._lock = threading.Lock()
+
+    def _to_pil(self):
+        source = self._source
+        if isinstance(source, (bytes, bytearray, memoryview)):
+            img = Image.open(BytesIO(source))
+            # Let JPEG decoders skip straight to roughly the target size
+            img.draft("RGB", (self.max_edge, self.max_edge))
+            return img
+        # fitz.Pixmap: wrap the raw samples instead of round-tripping through PNG
+        mode = {1: "L", 2: "LA", 3: "RGB", 4: "RGBA"}[source.n]
+        return Image.frombuffer(mode, (source.width, source.height), source.samples_mv, "raw", mode, 0, 1)
+
+    @property
+    def b64(self):
+        with self._lock:
+            if self._b64 is None:
+                img = self._to_pil()
+                if img.mode != 'RGB':
+                    img = img.convert('RGB')
+                img.thumbnail((self.max_edge, self.max_edge))
+                buffered = BytesIO()
+                img.save(buffered, format="JPEG", quality=self.quality)
+                self._b64 = base64.b64encode(buffered.getvalue()).decode("utf-8")
+                # The source is no longer needed once the payload exists
+                self._source = None
+            return self._b64
+
+
+_prepared = OrderedDict()
+_prepared_lock = threading.Lock()
+
+
+def _source_digest(source):
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return hashlib.sha256(source).hexdigest()
+    digest = hashlib.sha256(f"{source.width}x{source.height}x{source.n}".encode("utf-8"))
+    digest.update(source.samples_mv)
+    return digest.hexdigest()
+
+
+def prepare_image(source, max_edge=None, quality=None):
+    """Return the memoized PreparedImage for raw image bytes or a fitz.Pixmap."""
+    if isinstance(source, PreparedImage):
+        return source
+    max_edge = max_edge or fastapi_config.VLM_IMAGE_MAX_EDGE
+    quality = quality or fastapi_config.VLM_IMAGE_QUALITY
+    key = (_source_digest(source), max_edge, quality)
+    with _prepared_lock:
+        prepared = _prepared.get(key)
+        if prepared is not None:
+            _prepared.move_to_end(key)
+            return prepared
+        prepared = PreparedImage(source, key[0], max_edge, quality)
+        _prepared[key] = prepared
+        while len(_prepared) > fastapi_config.VLM_IMAGE_MEMO_SIZE:
+            _prepared.popitem(last=False)
+        return prepared
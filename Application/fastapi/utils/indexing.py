@@ -0,0 +1,48 @@
+from itertools import islice
+from llama_index.core import Settings
+from llama_index.core.ingestion import run_transformations
+from config import fastapi_config
+from utils.embedding import get_embedder
+
+
+def batched(iterable, batch_size):
+    """Yield lists of up to batch_size items from an iterable."""
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, batch_size)):
+        yield batch
+
+
+def insert_documents(index, documents, batch_size=None, lexical_index=None):
+    """Chunk, embed and insert Documents into an index in fixed-size node batches.
+
+    Embeddings are computed by the shared BatchEmbedder before insertion, so
+    the index does not re-embed the nodes itself.
+
+    documents may be any iterable, including the streaming loaders in
+    utils.document_processors, so only one batch of nodes is held in memory
+    and each batch is searchable as soon as it is inserted. Each batch also
+    goes into lexical_index, if given, so BM25 sees the same nodes. Returns
+    the number of nodes inserted.
+    """
+    batch_size = batch_size or fastapi_config.INDEX_BATCH_SIZE
+    embedder = get_embedder()
+    pending_nodes = []
+    inserted = 0
+
+    def insert(nodes):
+        index.insert_nodes(embedder.embed_nodes(nodes))
+        if lexical_index is not None:
+            lexical_index.add_nodes(nodes)
+
+    # A few Documents at a time go through the splitter; nodes are flushed
+    # to the vector store whenever a full batch has accumulated.
+    for document_batch in batched(documents, 16):
+        pending_nodes.extend(run_transformations(document_batch, Settings.transformations))
+        while len(pending_nodes) >= batch_size:
+            insert(pending_nodes[:batch_size])
+            inserted += batch_size
+            pending_nodes = pending_nodes[batch_size:]
+    if pending_nodes:
+        insert(pending_nodes)
+        inserted += len(pending_nodes)
+    return inserted
@@ -0,0 +1,87 @@
+import hashlib
+import json
+import os
+from config import fastapi_config
+
+
+def file_digest(path, chunk_size=1024 * 1024):
+    """Return the sha256 hex digest of a file, read in chunks."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class IngestManifest:
+    """Persistent record of ingested files and the Document ids they produced.
+
+    Entries are keyed by absolute path and hold size, mtime, sha256 and
+    doc_ids. Nodes in the vector store carry their Document id as ref_doc_id,
+    so doc_ids is what is needed to delete a file's nodes again.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or fastapi_config.INGEST_MANIFEST_PATH
+        self.entries = {}
+        if os.path.exists(self.path):
+            with open(self.path, "r", encoding="utf-8") as f:
+                self.entries = json.load(f)
+
+    def plan(self, directory):
+        """Compare a directory with the manifest.
+
+        Returns a dict of absolute paths under "added", "updated", "skipped"
+        and "deleted". Files whose size and mtime are unchanged are skipped
+        without hashing; touched files with the same content are skipped too.
+        """
+        directory = os.path.abspath(directory)
+        plan = {"added": [], "updated": [], "skipped": [], "deleted": []}
+        present = set()
+
+        for filename in sorted(os.listdir(directory)):
+            path = os.path.join(directory, filename)
+            if not os.path.isfile(path):
+                continue
+            present.add(path)
+            entry = self.entries.get(path)
+            if entry is None:
+                plan["added"].append(path)
+                continue
+            stat = os.stat(path)
+            if entry["size"] == stat.st_size and entry["mtime"] == stat.st_mtime:
+                plan["skipped"].append(path)
+            elif entry["sha256"] == file_digest(path):
+                entry["mtime"] = stat.st_mtime
+                plan["skipped"].append(path)
+            else:
+                plan["updated"].append(path)
+
+        for path in self.entries:
+            if os.path.dirname(path) == directory and path not in present:
+                plan["deleted"].append(path)
+        return plan
+
+    def record(self, path, doc_ids):
+        """Store the current size, mtime and hash of a file with its Document ids."""
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        self.entries[path] = {
+            "size": stat.st_size,
+            "mtime": stat.st_mtime,
+            "sha256": file_digest(path),
+            "doc_ids": list(doc_ids),
+        }
+
+    def forget(self, path):
+        """Drop a file from the manifest and return the Document ids it had produced."""
+        entry = self.entries.pop(os.path.abspath(path), None)
+        return entry["doc_ids"] if entry else []
+
+    def save(self):
+        """Atomically write the manifest back to disk."""
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.entries, f)
+        os.replace(tmp_path, self.path)
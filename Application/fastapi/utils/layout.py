@@ -0,0 +1,81 @@
+import numpy as np
+
+
+def intersects_any(boxes, rects):
+    """Return a bool array telling which boxes overlap at least one rect.
+
+    Both arguments are sequences of (x0, y0, x1, y1); overlap is strict, as
+    with fitz.Rect.intersects.
+    """
+    boxes = np.asarray(boxes, dtype=float).reshape(-1, 4)
+    rects = np.asarray([tuple(rect) for rect in rects], dtype=float).reshape(-1, 4)
+    if not len(boxes) or not len(rects):
+        return np.zeros(len(boxes), dtype=bool)
+    b = boxes[:, None, :]
+    r = rects[None, :, :]
+    overlap = (b[..., 0] < r[..., 2]) & (r[..., 0] < b[..., 2]) & (b[..., 1] < r[..., 3]) & (r[..., 1] < b[..., 3])
+    return overlap.any(axis=1)
+
+
+class BlockIndex:
+    """Text blocks of one page with their bounding boxes in a NumPy array.
+
+    Blocks keep their reading order; a y0-sorted copy of the boxes lets
+    caption lookups consider only blocks in a vertical window around the item.
+    """
+
+    def __init__(self, blocks):
+        self.blocks = list(blocks)
+        self.boxes = np.array([block[:4] for block in self.blocks], dtype=float).reshape(-1, 4)
+        self._order = np.argsort(self.boxes[:, 1], kind="stable")
+        self._sorted_y0 = self.boxes[self._order, 1]
+        heights = self.boxes[:, 3] - self.boxes[:, 1]
+        self._max_height = float(heights.max()) if len(heights) else 0.0
+
+    @classmethod
+    def from_page(cls, page, band_percentage=0.1):
+        """Index the text blocks of a page, dropping the header and footer bands."""
+        blocks = page.get_text("blocks", sort=True)
+        if not blocks:
+            return cls([])
+        boxes = np.array([block[:4] for block in blocks], dtype=float)
+        is_text = np.array([block[-1] == 0 for block in blocks])
+        page_height = page.rect.height
+        in_body = (boxes[:, 1] >= page_height * band_percentage) & (boxes[:, 3] <= page_height * (1 - band_percentage))
+        return cls([blocks[idx] for idx in np.flatnonzero(is_text & in_body)])
+
+    def __len__(self):
+        return len(self.blocks)
+
+    def _candidates(self, y_low, y_high):
+        # Blocks whose vertical extent can reach [y_low, y_high], in reading order
+        lo = np.searchsorted(self._sorted_y0, y_low - self._max_height, side="left")
+        hi = np.searchsorted(self._sorted_y0, y_high, side="right")
+        return np.sort(self._order[lo:hi])
+
+    def text_around(self, bbox, page_height, threshold_percentage=0.1):
+        """Return the text of the blocks just above and below bbox.
+
+        Same result as scanning the blocks in reading order: the first block
+        within the vertical threshold that ends above bbox, and the first
+        that starts below it. A block above only counts if it comes before
+        the block below.
+        """
+        if not len(self.blocks):
+            return "", ""
+        x0, y0, x1, y1 = bbox
+        threshold = page_height * threshold_percentage
+        idx = self._candidates(y0 - threshold, y1 + threshold)
+        if not len(idx):
+            return "", ""
+        boxes = self.boxes[idx]
+        vertical_distance = np.minimum(np.abs(boxes[:, 3] - y0), np.abs(boxes[:, 1] - y1))
+        near = vertical_distance <= threshold
+        above = np.flatnonzero(near & (boxes[:, 3] < y0))
+        below = np.flatnonzero(near & (boxes[:, 1] > y1))
+
+        after_text = self.blocks[idx[below[0]]][4] if len(below) else ""
+        before_text = ""
+        if len(above) and (not len(below) or above[0] < below[0]):
+            before_text = self.blocks[idx[above[0]]][4]
+        return before_text, after_text
@@ -0,0 +1,371 @@
+import json
+import os
+import re
+import sqlite3
+import threading
+from typing import Any, List
+import numpy as np
+from llama_index.core.bridge.pydantic import PrivateAttr
+from llama_index.core.vector_stores.types import BasePydanticVectorStore, VectorStoreQuery, VectorStoreQueryResult
+from llama_index.core.vector_stores.utils import metadata_dict_to_node, node_to_metadata_dict
+from utils.publications import set_publication_id
+
+# Rows dequantized per step of an int8 scan; a 4 MB float32 scratch at
+# 1024 dims stays in cache, which measured faster than larger steps
+SCAN_CHUNK_ROWS = 1024
+
+
+def quantize_int8(vectors):
+    """Symmetric per-vector int8 quantization: returns (codes, scales) with vectors ~= codes * scales."""
+    scales = np.abs(vectors).max(axis=1) / 127
+    scales[scales == 0] = 1
+    codes = np.round(vectors / scales[:, None]).astype(np.int8)
+    return codes, scales.astype(np.float32)
+
+
+def _map(path, dtype, shape):
+    if not shape[0]:
+        return np.zeros(shape, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode="r", shape=shape)
+
+
+class LocalVectorStore(BasePydanticVectorStore):
+    """Embedded, file-backed vector store with exact inner-product search.
+
+    Unit-normalized embeddings are appended to ``vectors.f32``, a raw
+    float32 matrix that is memory-mapped for search. Each node row,
+    including its text and metadata, lives in ``nodes.sqlite3``.
+    Deleting or replacing a node drops its row, and the stale vector stays
+    in the file but is masked out until more than ``compact_ratio`` of the
+    rows are dead; ``compact`` then rewrites the files with live rows only.
+    Filters are exact matches on metadata keys, the same subset the Milvus
+    store supports.
+
+    With ``quantization="int8"`` each vector also gets an int8 code and a
+    float32 scale (``vectors.i8``, ``scales.f32``). Searches scan only the
+    codes, a quarter of the float bytes, and then rescore the best
+    ``top_k * rescore_factor`` candidates exactly against the float rows.
+    Those rows are read through the memory map, so they need not stay
+    resident. Codes missing for existing float rows are built on open.
+    """
+
+    stores_text: bool = True
+    flat_metadata: bool = False
+    persist_dir: str
+    dim: int
+    quantization: str = "none"
+    rescore_factor: int = 4
+    compact_ratio: float = 0.3
+
+    _lock: Any = PrivateAttr()
+    _conn: Any = PrivateAttr()
+    _vectors: Any = PrivateAttr()
+    _codes: Any = PrivateAttr()
+    _scales: Any = PrivateAttr()
+    _live: Any = PrivateAttr()
+
+    def __init__(self, persist_dir, dim=1024, quantization="none", rescore_factor=4, compact_ratio=0.3, **kwargs):
+        if quantization not in ("none", "int8"):
+            raise ValueError(f"Unknown quantization: {quantization}")
+        super().__init__(persist_dir=persist_dir, dim=dim, quantization=quantization,
+                         rescore_factor=rescore_factor, compact_ratio=compact_ratio, **kwargs)
+        os.makedirs(persist_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(os.path.join(persist_dir, "nodes.sqlite3"), timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(
+            "CREATE TABLE IF NOT EXISTS nodes ("
+            "row INTEGER PRIMARY KEY, node_id TEXT UNIQUE NOT NULL, ref_doc_id TEXT, node TEXT NOT NULL);"
+            "CREATE INDEX IF NOT EXISTS nodes_ref_doc_id ON nodes (ref_doc_id);"
+            "CREATE INDEX IF NOT EXISTS nodes_publication_id ON nodes (json_extract(node, '$.publication_id'));"
+            "CREATE TABLE IF NOT EXISTS state (key TEXT PRIMARY KEY, value TEXT NOT NULL);"
+        )
+        self._finish_compaction()
+        if self.quantized:
+            self._backfill_codes()
+        self._load()
+
+    @classmethod
+    def class_name(cls):
+        return "LocalVectorStore"
+
+    @property
+    def client(self):
+        return None
+
+    @property
+    def quantized(self):
+        return self.quantization == "int8"
+
+    @property
+    def _vectors_path(self):
+        return os.path.join(self.persist_dir, "vectors.f32")
+
+    @property
+    def _codes_path(self):
+        return os.path.join(self.persist_dir, "vectors.i8")
+
+    @property
+    def _scales_path(self):
+        return os.path.join(self.persist_dir, "scales.f32")
+
+    def _file_rows(self, path, row_bytes):
+        return os.path.getsize(path) // row_bytes if os.path.exists(path) else 0
+
+    def _backfill_codes(self):
+        # Quantize float rows that have no code yet: a store created without
+        # quantization, or an add interrupted between the two files
+        float_rows = self._file_rows(self._vectors_path, 4 * self.dim)
+        code_rows = min(self._file_rows(self._codes_path, self.dim), self._file_rows(self._scales_path, 4))
+        if code_rows >= float_rows:
+            return
+        for path, row_bytes in ((self._codes_path, self.dim), (self._scales_path, 4)):
+            with open(path, "ab") as f:
+                f.truncate(code_rows * row_bytes)
+        vectors = _map(self._vectors_path, np.float32, (float_rows, self.dim))
+        for start in range(code_rows, float_rows, SCAN_CHUNK_ROWS):
+            self._append_codes(np.asarray(vectors[start:start + SCAN_CHUNK_ROWS]))
+
+    def _append_codes(self, vectors):
+        codes, scales = quantize_int8(vectors)
+        with open(self._codes_path, "ab") as f:
+            codes.tofile(f)
+        with open(self._scales_path, "ab") as f:
+            scales.tofile(f)
+
+    def _load(self):
+        rows = self._remap()
+        self._live = np.zeros(rows, dtype=bool)
+        live_rows = [row for (row,) in self._conn.execute("SELECT row FROM nodes") if row < rows]
+        self._live[live_rows] = True
+
+    def _remap(self):
+        # Re-open the memory maps after the files grew; returns the row count
+        rows = self._file_rows(self._vectors_path, 4 * self.dim)
+        self._vectors = _map(self._vectors_path, np.float32, (rows, self.dim))
+        if self.quantized:
+            self._codes = _map(self._codes_path, np.int8, (rows, self.dim))
+            self._scales = _map(self._scales_path, np.float32, (rows,))
+        return rows
+
+    def count(self):
+        """Number of live nodes. (No __len__: an empty store must still be truthy.)"""
+        return int(self._live.sum())
+
+    def add(self, nodes: List[Any], **add_kwargs: Any) -> List[str]:
+        if not nodes:
+            return []
+        embeddings = np.asarray([node.get_embedding() for node in nodes], dtype=np.float32)
+        norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+        embeddings /= np.where(norms == 0, 1, norms)
+        node_ids = [node.node_id for node in nodes]
+        with self._lock:
+            # Rows are numbered by the vector file itself, so rows left behind
+            # by a crashed add can never shift later nodes onto wrong vectors
+            first_row = self._file_rows(self._vectors_path, 4 * self.dim)
+            try:
+                # Vectors first: after a crash they are masked rows, never dangling nodes
+                with open(self._vectors_path, "ab") as f:
+                    embeddings.tofile(f)
+                if self.quantized:
+                    self._append_codes(embeddings)
+                with self._conn:
+                    self._drop("node_id", node_ids)
+                    self._conn.executemany(
+                        "INSERT INTO nodes (row, node_id, ref_doc_id, node) VALUES (?, ?, ?, ?)",
+                        [
+                            (first_row + offset, node.node_id, node.ref_doc_id, self._serialize(node))
+                            for offset, node in enumerate(nodes)
+                        ],
+                    )
+            except Exception:
+                # The transaction rolled back: drop the appended rows and the
+                # live flags _drop cleared for nodes that are still stored
+                self._truncate(first_row)
+                self._load()
+                raise
+            rows = self._remap()
+            self._live = np.concatenate([self._live, np.zeros(rows - len(self._live), dtype=bool)])
+            self._live[first_row:first_row + len(nodes)] = True
+            self._maybe_compact()
+        return node_ids
+
+    def _truncate(self, rows):
+        paths = [(self._vectors_path, 4 * self.dim)]
+        if self.quantized:
+            paths += [(self._codes_path, self.dim), (self._scales_path, 4)]
+        for path, row_bytes in paths:
+            if os.path.exists(path):
+                with open(path, "ab") as f:
+                    f.truncate(rows * row_bytes)
+
+    def _serialize(self, node):
+        # The embedding is already in the vector file, and pydantic would walk
+        # (and assigning it back would re-validate) it element by element
+        node = node.copy(update={"embedding": None})
+        return json.dumps(node_to_metadata_dict(node, remove_text=False, flat_metadata=self.flat_metadata))
+
+    def _drop(self, column, values):
+        placeholders = ",".join("?" * len(values))
+        rows = [row for (row,) in self._conn.execute(
+            f"SELECT row FROM nodes WHERE {column} IN ({placeholders})", values)]
+        self._conn.execute(f"DELETE FROM nodes WHERE {column} IN ({placeholders})", values)
+        self._live[[row for row in rows if row < len(self._live)]] = False
+
+    def backfill_publication_ids(self, derive):
+        """Tag nodes stored without a publication id with derive(metadata["source"]).
+
+        Returns the number of nodes tagged; nodes derive returns None for stay untagged.
+        """
+        with self._lock, self._conn:
+            updates = []
+            for row, stored in self._conn.execute(
+                    "SELECT row, node FROM nodes WHERE json_extract(node, '$.publication_id') IS NULL").fetchall():
+                node = metadata_dict_to_node(json.loads(stored))
+                pub_id = derive(node.metadata.get("source"))
+                if pub_id:
+                    set_publication_id(node, pub_id)
+                    updates.append((self._serialize(node), row))
+            self._conn.executemany("UPDATE nodes SET node = ? WHERE row = ?", updates)
+        return len(updates)
+
+    def delete(self, ref_doc_id: str, **delete_kwargs: Any) -> None:
+        with self._lock:
+            with self._conn:
+                self._drop("ref_doc_id", [ref_doc_id])
+            self._maybe_compact()
+
+    def _maybe_compact(self):
+        rows = len(self._live)
+        if rows and (rows - self.count()) / rows > self.compact_ratio:
+            self._compact()
+
+    def compact(self):
+        """Rewrite the vector files with live rows only and renumber the node rows."""
+        with self._lock:
+            self._compact()
+
+    def _compact(self):
+        live_rows = np.flatnonzero(self._live)
+        files = [(self._vectors_path, self._vectors)]
+        if self.quantized:
+            files += [(self._codes_path, self._codes), (self._scales_path, self._scales)]
+        for path, data in files:
+            with open(path + ".compact", "wb") as f:
+                for start in range(0, len(live_rows), SCAN_CHUNK_ROWS):
+                    np.asarray(data[live_rows[start:start + SCAN_CHUNK_ROWS]]).tofile(f)
+        # Rows only move down, so renumbering in ascending order never collides
+        with self._conn:
+            self._conn.executemany("UPDATE nodes SET row = ? WHERE row = ?",
+                                   [(new, int(old)) for new, old in enumerate(live_rows)])
+            self._conn.execute("INSERT OR REPLACE INTO state VALUES ('compacted_files', ?)",
+                               (json.dumps([path for path, _ in files]),))
+        self._finish_compaction()
+        self._load()
+
+    def _finish_compaction(self):
+        # Once the renumbered rows are committed, swap in the compacted files
+        # and drop code files that were not rewritten, since their rows are
+        # stale. On open this completes a swap cut short by a crash, or
+        # removes compacted files whose renumbering never committed.
+        pending = self._conn.execute("SELECT value FROM state WHERE key = 'compacted_files'").fetchone()
+        compacted = json.loads(pending[0]) if pending else []
+        for path in (self._vectors_path, self._codes_path, self._scales_path):
+            if path in compacted:
+                if os.path.exists(path + ".compact"):
+                    os.replace(path + ".compact", path)
+            else:
+                if os.path.exists(path + ".compact"):
+                    os.remove(path + ".compact")
+                if pending and os.path.exists(path):
+                    os.remove(path)
+        if pending:
+            with self._conn:
+                self._conn.execute("DELETE FROM state WHERE key = 'compacted_files'")
+
+    def _candidate_rows(self, query):
+        # Rows allowed by the query's filters, or None for all live rows
+        clauses, params = [], []
+        if query.filters is not None:
+            for metadata_filter in query.filters.legacy_filters():
+                if not re.fullmatch(r"\w+", metadata_filter.key):
+                    raise ValueError(f"Unsupported metadata filter key: {metadata_filter.key}")
+                clauses.append(f"json_extract(node, '$.{metadata_filter.key}') = ?")
+                params.append(metadata_filter.value)
+        for column, values in (("ref_doc_id", query.doc_ids), ("node_id", query.node_ids)):
+            if values:
+                clauses.append(f"{column} IN ({','.join('?' * len(values))})")
+                params.extend(values)
+        if not clauses:
+            return None
+        rows = [row for (row,) in self._conn.execute(f"SELECT row FROM nodes WHERE {' AND '.join(clauses)}", params)]
+        return np.asarray([row for row in rows if row < len(self._live)], dtype=np.int64)
+
+    def _score(self, query_vector, rows):
+        """Similarity of the query with every row (rows=None) or with the given rows.
+
+        Approximate, from the int8 codes, when the store is quantized.
+        """
+        if not self.quantized:
+            if rows is None:
+                scores = np.asarray(self._vectors @ query_vector)
+                scores[~self._live] = -np.inf
+                return scores
+            return np.asarray(self._vectors[rows] @ query_vector)
+
+        count = len(self._live) if rows is None else len(rows)
+        scores = np.empty(count, dtype=np.float32)
+        scratch = np.empty((SCAN_CHUNK_ROWS, self.dim), dtype=np.float32)
+        for start in range(0, count, SCAN_CHUNK_ROWS):
+            chunk = slice(start, start + SCAN_CHUNK_ROWS) if rows is None else rows[start:start + SCAN_CHUNK_ROWS]
+            codes = self._codes[chunk]
+            dequantized = scratch[:len(codes)]
+            np.copyto(dequantized, codes, casting="unsafe")
+            np.matmul(dequantized, query_vector, out=scores[start:start + len(codes)])
+        scores *= self._scales if rows is None else self._scales[rows]
+        if rows is None:
+            scores[~self._live] = -np.inf
+        return scores
+
+    def memory_usage(self):
+        """Bytes the store keeps per purpose, for capacity planning and benchmarks."""
+        rows = len(self._live)
+        scanned = rows * (self.dim + 4) if self.quantized else rows * self.dim * 4
+        return {
+            "rows": rows,
+            "live_nodes": self.count(),
+            "float_vector_bytes": rows * self.dim * 4,
+            "scanned_bytes": scanned,
+            "scanned_bytes_per_node": scanned / rows if rows else 0,
+            "metadata_bytes": os.path.getsize(os.path.join(self.persist_dir, "nodes.sqlite3")),
+        }
+
+    def query(self, query: VectorStoreQuery, **kwargs: Any) -> VectorStoreQueryResult:
+        query_vector = np.asarray(query.query_embedding, dtype=np.float32)
+        norm = np.linalg.norm(query_vector)
+        if norm:
+            query_vector = query_vector / norm
+        with self._lock:
+            rows = self._candidate_rows(query)
+            available = self.count() if rows is None else len(rows)
+            top_k = min(query.similarity_top_k, available)
+            if top_k == 0:
+                return VectorStoreQueryResult(nodes=[], similarities=[], ids=[])
+            scores = self._score(query_vector, rows)
+            candidates = min(available, top_k * self.rescore_factor) if self.quantized else top_k
+            best = np.argpartition(-scores, candidates - 1)[:candidates]
+            candidate_rows = best if rows is None else rows[best]
+            if self.quantized:
+                # Exact scores for the shortlist, read from the float rows
+                candidate_rows = np.sort(candidate_rows)
+                candidate_scores = np.asarray(self._vectors[candidate_rows] @ query_vector)
+            else:
+                candidate_scores = scores[best]
+            order = np.argsort(-candidate_scores)[:top_k]
+            best_rows = candidate_rows[order]
+            similarities = [float(score) for score in candidate_scores[order]]
+            placeholders = ",".join("?" * len(best_rows))
+            stored = dict(self._conn.execute(
+                f"SELECT row, node FROM nodes WHERE row IN ({placeholders})", [int(row) for row in best_rows]))
+        nodes = [metadata_dict_to_node(json.loads(stored[int(row)])) for row in best_rows]
+        return VectorStoreQueryResult(nodes=nodes, similarities=similarities, ids=[node.node_id for node in nodes])
@@ -0,0 +1,33 @@
+import threading
+from collections import Counter
+
+# Process-local ingestion counters. Parse workers drain theirs and hand them
+# back to the parent along with their Documents, see iter_pdf_documents.
+_counters = Counter()
+_lock = threading.Lock()
+
+
+def increment(name, amount=1):
+    """Add amount to the named counter."""
+    with _lock:
+        _counters[name] += amount
+
+
+def snapshot():
+    """Return a copy of all counters."""
+    with _lock:
+        return dict(_counters)
+
+
+def drain():
+    """Return all counters and reset them to zero."""
+    with _lock:
+        counters = dict(_counters)
+        _counters.clear()
+    return counters
+
+
+def merge(counters):
+    """Add counters drained from another process."""
+    with _lock:
+        _counters.update(counters)
@@ -0,0 +1,67 @@
+from collections import deque
+from python_multipart.multipart import MultipartParser, parse_options_header
+
+
+async def open_multipart_file(body, content_type, field_name="file"):
+    """Find a file field in a streamed multipart/form-data body.
+
+    body is an async iterator of bytes chunks, such as request.stream().
+    Returns (filename, chunks), where chunks is an async iterator over the
+    field's bytes that only pulls more of the body as it is consumed, so the
+    file is never spooled to memory or disk. Returns None when the body has
+    no file field of that name.
+    """
+    _, params = parse_options_header(content_type)
+    boundary = params.get(b"boundary")
+    if not boundary:
+        raise ValueError("Missing multipart boundary.")
+
+    # Parser callbacks fire inside write(); they queue ("part", headers),
+    # ("data", bytes) and ("end", None) events for the readers below
+    events = deque()
+    headers = {}
+    header_field, header_value = bytearray(), bytearray()
+
+    def on_header_end():
+        headers[bytes(header_field).lower()] = bytes(header_value)
+        header_field.clear()
+        header_value.clear()
+
+    def on_headers_finished():
+        events.append(("part", dict(headers)))
+        headers.clear()
+
+    parser = MultipartParser(boundary, callbacks={
+        "on_header_field": lambda data, start, end: header_field.extend(data[start:end]),
+        "on_header_value": lambda data, start, end: header_value.extend(data[start:end]),
+        "on_header_end": on_header_end,
+        "on_headers_finished": on_headers_finished,
+        "on_part_data": lambda data, start, end: events.append(("data", bytes(data[start:end]))),
+        "on_part_end": lambda: events.append(("end", None)),
+    })
+    body = body.__aiter__()
+
+    async def next_event():
+        while not events:
+            try:
+                chunk = await body.__anext__()
+            except StopAsyncIteration:
+                parser.finalize()
+                return events.popleft() if events else None
+            if chunk:
+                parser.write(chunk)
+        return events.popleft()
+
+    while (event := await next_event()) is not None:
+        kind, part_headers = event
+        if kind != "part":
+            continue
+        _, disposition = parse_options_header(part_headers.get(b"content-disposition"))
+        if disposition.get(b"name") == field_name.encode() and b"filename" in disposition:
+            filename = disposition[b"filename"].decode("utf-8", "replace")
+
+            async def chunks():
+                while (event := await next_event()) is not None and event[0] == "data":
+                    yield event[1]
+            return filename, chunks()
+    return None
@@ -0,0 +1,187 @@
+import asyncio
+import itertools
+import multiprocessing
+import os
+import random
+import threading
+import httpx
+from llama_index.llms.nvidia import NVIDIA
+from config import fastapi_config
+
+NEVA_MODEL = "nvidia/neva-22b"
+DEPLOT_MODEL = "google/deplot"
+NEVA_URL = f"https://ai.api.nvidia.com/v1/vlm/{NEVA_MODEL}"
+DEPLOT_URL = f"https://ai.api.nvidia.com/v1/vlm/{DEPLOT_MODEL}"
+CHART_LLM_MODEL = "meta/llama-3.1-70b-instruct"
+
+DESCRIBE_PROMPT = "Describe what you see in this image."
+DEPLOT_PROMPT = "Generate underlying data table of the figure below:"
+# Rate limiting and transient server errors are retried with backoff
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+EXPLAIN_TABLE_PROMPT = "Your responsibility is to explain charts. You are an expert in describing the responses of linearized tables into plain English text for LLMs to use. Explain the following linearized table. "
+
+
+class NimClient:
+    """Asynchronous client for the NVIDIA VLM, Deplot and chart-explaining LLM endpoints.
+
+    All requests share one HTTP connection pool, and at most ``max_in_flight``
+    of them are outstanding at any time. That limit is per process: PDF
+    parse worker processes each get an equal share of NIM_MAX_IN_FLIGHT, so
+    the server process and its workers together stay near twice the setting.
+    VLM requests that hit a 429, a 5xx or a transport error are retried up
+    to ``max_retries`` times with exponential backoff.
+    """
+
+    def __init__(self, api_key=None, max_in_flight=None, timeout=None, max_retries=None):
+        self.api_key = api_key or fastapi_config.NVIDIA_API_KEY
+        self.max_in_flight = max_in_flight or default_max_in_flight()
+        self.timeout = timeout or fastapi_config.NIM_TIMEOUT
+        self.max_retries = fastapi_config.NIM_MAX_RETRIES if max_retries is None else max_retries
+        self._http = None
+        self._semaphore = None
+        self._llm = None
+
+    def _get_http(self):
+        if not self.api_key:
+            raise ValueError("NVIDIA API Key is not set. Please set the NVIDIA_API_KEY environment variable.")
+        if self._http is None:
+            self._http = httpx.AsyncClient(
+                headers={"Authorization": f"Bearer {self.api_key}", "Accept": "application/json"},
+                timeout=self.timeout,
+                limits=httpx.Limits(max_connections=self.max_in_flight,
+                                    max_keepalive_connections=self.max_in_flight),
+            )
+            self._semaphore = asyncio.Semaphore(self.max_in_flight)
+        return self._http
+
+    async def aclose(self):
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
+
+    async def _post_vlm(self, url, payload):
+        http = self._get_http()
+        for attempt in itertools.count():
+            try:
+                async with self._semaphore:
+                    response = await http.post(url, json=payload)
+                response.raise_for_status()
+                return response.json()["choices"][0]['message']['content']
+            except (httpx.HTTPStatusError, httpx.TransportError) as e:
+                response = getattr(e, "response", None)
+                if attempt >= self.max_retries or (response is not None and response.status_code not in RETRY_STATUSES):
+                    raise
+                # Sleep outside the semaphore so waiting retries do not hold slots
+                await asyncio.sleep(retry_delay(attempt, response))
+
+    async def describe_image(self, image_b64):
+        """Generate a description of a base64 encoded image with neva-22b."""
+        payload = {
+            "messages": [
+                {
+                    "role": "user",
+                    "content": f'{DESCRIBE_PROMPT} <img src="data:image/jpeg;base64,{image_b64}" />'
+                }
+            ],
+            "max_tokens": 1024,
+            "temperature": 0.20,
+            "top_p": 0.70,
+            "seed": 0,
+            "stream": False
+        }
+        return await self._post_vlm(NEVA_URL, payload)
+
+    async def deplot(self, image_b64):
+        """Linearize the data table behind a base64 encoded chart with Deplot."""
+        payload = {
+            "messages": [
+                {
+                    "role": "user",
+                    "content": f'{DEPLOT_PROMPT} <img src="data:image/jpeg;base64,{image_b64}" />'
+                }
+            ],
+            "max_tokens": 1024,
+            "temperature": 0.20,
+            "top_p": 0.20,
+            "stream": False
+        }
+        return await self._post_vlm(DEPLOT_URL, payload)
+
+    async def explain_table(self, linearized_table):
+        """Turn a linearized table into plain English with the chart LLM."""
+        if self._llm is None:
+            self._get_http()
+            self._llm = NVIDIA(model_name=CHART_LLM_MODEL)
+        async with self._semaphore:
+            response = await self._llm.acomplete(EXPLAIN_TABLE_PROMPT + linearized_table)
+        return response.text
+
+
+def default_max_in_flight():
+    """NIM_MAX_IN_FLIGHT for the server process, an equal share of it in a parse worker."""
+    if multiprocessing.parent_process() is None:
+        return fastapi_config.NIM_MAX_IN_FLIGHT
+    return max(1, fastapi_config.NIM_MAX_IN_FLIGHT // max(1, fastapi_config.PDF_PARSE_WORKERS))
+
+
+def retry_delay(attempt, response=None):
+    """Seconds to wait before retry number attempt + 1, honouring a numeric Retry-After."""
+    retry_after = response.headers.get("Retry-After") if response is not None else None
+    if retry_after and retry_after.isdigit():
+        return min(float(retry_after), fastapi_config.NIM_RETRY_MAX_DELAY)
+    delay = fastapi_config.NIM_RETRY_BASE_DELAY * 2 ** attempt
+    return min(delay, fastapi_config.NIM_RETRY_MAX_DELAY) * random.uniform(0.5, 1.0)
+
+
+# The client and its connection pool live on one background event loop per
+# process, so synchronous ingestion code (including code that is already
+# running inside FastAPI's loop, or in a forked parse worker) can submit to it.
+_loop = None
+_loop_pid = None
+_loop_lock = threading.Lock()
+_client = None
+
+
+def _get_loop():
+    global _loop, _loop_pid, _client
+    with _loop_lock:
+        if _loop is None or _loop_pid != os.getpid():
+            _loop = asyncio.new_event_loop()
+            _loop_pid = os.getpid()
+            _client = NimClient()
+            threading.Thread(target=_loop.run_forever, name="nim-client", daemon=True).start()
+    return _loop
+
+
+def get_client():
+    """Return the per-process NimClient bound to the background event loop."""
+    _get_loop()
+    return _client
+
+
+def run(coro):
+    """Run a coroutine on the client loop and block until it finishes."""
+    return asyncio.run_coroutine_threadsafe(coro, _get_loop()).result()
+
+
+async def _gather(coros):
+    return await asyncio.gather(*coros)
+
+
+def gather(coros):
+    """Run coroutines concurrently on the client loop and return their results in order."""
+    coros = list(coros)
+    if not coros:
+        return []
+    return run(_gather(coros))
+
+
+def close():
+    """Close the client's connection pool and stop the background loop."""
+    global _loop, _client
+    with _loop_lock:
+        if _loop is None or _loop_pid != os.getpid():
+            return
+        asyncio.run_coroutine_threadsafe(_client.aclose(), _loop).result()
+        _loop.call_soon_threadsafe(_loop.stop)
+        _loop, _client = None, None
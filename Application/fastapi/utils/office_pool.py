@@ -0,0 +1,208 @@
+import os
+import queue
+import shutil
+import socket
+import subprocess
+import tempfile
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from config import fastapi_config
+
+try:
+    import uno
+    from com.sun.star.beans import PropertyValue
+except ImportError:  # LibreOffice's Python bindings are not installed
+    uno = None
+
+
+def _free_port():
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _property(name, value):
+    prop = PropertyValue()
+    prop.Name = name
+    prop.Value = value
+    return prop
+
+
+class OfficeWorker:
+    """One long-lived headless LibreOffice process with its own user profile.
+
+    The process listens on a local socket and every conversion is a UNO call
+    into the already running office, so only the first job pays for startup.
+    """
+
+    def __init__(self, worker_id):
+        self.worker_id = worker_id
+        self.profile_dir = tempfile.mkdtemp(prefix=f"office-profile-{worker_id}-")
+        self.process = None
+        self.desktop = None
+
+    def _profile_arg(self):
+        return f"-env:UserInstallation=file://{self.profile_dir}"
+
+    def start(self):
+        port = _free_port()
+        self.process = subprocess.Popen(
+            [fastapi_config.OFFICE_BINARY, "--headless", "--invisible", "--nologo", "--norestore",
+             "--nodefault", self._profile_arg(),
+             f"--accept=socket,host=127.0.0.1,port={port};urp;StarOffice.ComponentContext"],
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        local_context = uno.getComponentContext()
+        resolver = local_context.ServiceManager.createInstanceWithContext(
+            "com.sun.star.bridge.UnoUrlResolver", local_context)
+        deadline = time.monotonic() + fastapi_config.OFFICE_STARTUP_TIMEOUT
+        while True:
+            try:
+                context = resolver.resolve(
+                    f"uno:socket,host=127.0.0.1,port={port};urp;StarOffice.ComponentContext")
+                break
+            except Exception:
+                if self.process.poll() is not None or time.monotonic() > deadline:
+                    self.stop()
+                    raise RuntimeError(f"LibreOffice worker {self.worker_id} failed to start")
+                time.sleep(0.25)
+        self.desktop = context.ServiceManager.createInstanceWithContext("com.sun.star.frame.Desktop", context)
+
+    def alive(self):
+        return self.process is not None and self.process.poll() is None
+
+    def convert(self, input_path, output_dir):
+        """Convert a document to PDF in output_dir and return the PDF path."""
+        input_path = os.path.abspath(input_path)
+        name_without_ext = os.path.splitext(os.path.basename(input_path))[0]
+        pdf_path = os.path.join(output_dir, f"{name_without_ext}.pdf")
+        document = self.desktop.loadComponentFromURL(
+            uno.systemPathToFileUrl(input_path), "_blank", 0, (_property("Hidden", True),))
+        try:
+            document.storeToURL(uno.systemPathToFileUrl(pdf_path),
+                                (_property("FilterName", "impress_pdf_Export"),))
+        finally:
+            document.close(True)
+        return pdf_path
+
+    def stop(self):
+        if self.process is not None and self.process.poll() is None:
+            self.process.kill()
+            self.process.wait()
+        self.process = None
+        self.desktop = None
+
+    def restart(self):
+        self.stop()
+        self.start()
+
+    def cleanup(self):
+        self.stop()
+        shutil.rmtree(self.profile_dir, ignore_errors=True)
+
+
+class OfficeConversionPool:
+    """Queue of PPT/PPTX to PDF conversions served by long-lived LibreOffice workers.
+
+    Each worker thread owns one OfficeWorker. A job that runs past
+    ``timeout`` seconds, or that leaves its office process dead, gets the
+    process killed and restarted before the worker takes the next job.
+    LibreOffice's Python bindings (``uno``) are required.
+    """
+
+    def __init__(self, size=None, timeout=None):
+        if uno is None:
+            raise RuntimeError("PPT conversion needs LibreOffice's Python bindings (uno), "
+                               "e.g. the python3-uno package; see the Dockerfile")
+        self.size = size or fastapi_config.OFFICE_POOL_SIZE
+        self.timeout = timeout or fastapi_config.OFFICE_JOB_TIMEOUT
+        self._jobs = queue.Queue()
+        self._workers = [OfficeWorker(worker_id) for worker_id in range(self.size)]
+        self._threads = []
+        for worker in self._workers:
+            thread = threading.Thread(target=self._serve, args=(worker,), name=f"office-{worker.worker_id}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def _serve(self, worker):
+        try:
+            worker.start()
+        except Exception as e:
+            print(f"Error starting LibreOffice worker {worker.worker_id}: {e}")
+        while True:
+            job = self._jobs.get()
+            if job is None:
+                worker.cleanup()
+                return
+            input_path, output_dir, future = job
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                if not worker.alive():
+                    worker.restart()
+                result = self._run_with_timeout(worker, input_path, output_dir)
+                future.set_result(result)
+            except Exception as e:
+                future.set_exception(e)
+                try:
+                    worker.restart()
+                except Exception as restart_error:
+                    print(f"Error restarting LibreOffice worker {worker.worker_id}: {restart_error}")
+
+    def _run_with_timeout(self, worker, input_path, output_dir):
+        # The conversion runs on a helper thread so a hung office process can
+        # be killed, which also unblocks the pending UNO call.
+        attempt = Future()
+
+        def convert():
+            try:
+                attempt.set_result(worker.convert(input_path, output_dir))
+            except Exception as e:
+                attempt.set_exception(e)
+
+        threading.Thread(target=convert, daemon=True).start()
+        try:
+            return attempt.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            worker.stop()
+            raise TimeoutError(f"Converting {input_path} took longer than {self.timeout}s")
+
+    def submit(self, input_path, output_dir):
+        """Queue a conversion and return a Future resolving to the PDF path."""
+        os.makedirs(output_dir, exist_ok=True)
+        future = Future()
+        self._jobs.put((input_path, output_dir, future))
+        return future
+
+    def convert(self, input_path, output_dir):
+        """Convert a document to PDF and wait for the result."""
+        return self.submit(input_path, output_dir).result()
+
+    def shutdown(self):
+        for _ in self._threads:
+            self._jobs.put(None)
+        for thread in self._threads:
+            thread.join()
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_office_pool():
+    """Return the process-wide OfficeConversionPool, starting it on first use."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = OfficeConversionPool()
+    return _pool
+
+
+def shutdown_office_pool():
+    """Stop the process-wide pool's workers, if it was ever started."""
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown()
@@ -0,0 +1,125 @@
+import re
+from typing import Any, Callable, List, Optional
+from llama_index.core.bridge.pydantic import Field
+from llama_index.core.postprocessor.types import BaseNodePostprocessor
+from llama_index.core.schema import MetadataMode, NodeWithScore, QueryBundle
+from llama_index.core.utils import get_tokenizer
+from config import fastapi_config
+from utils import metrics
+
+
+def _shingles(text, size=3):
+    words = re.findall(r"\w+", text.lower())
+    if len(words) <= size:
+        return {tuple(words)} if words else set()
+    return {tuple(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+
+def drop_near_duplicates(nodes, threshold=0.6):
+    """Drop nodes whose text is mostly contained in a better-ranked node.
+
+    Overlap is measured on word 3-gram shingles relative to the smaller of
+    the two nodes, so a table or image caption that repeats the paragraph
+    it was cut from counts as a duplicate of that paragraph.
+    """
+    kept, kept_shingles = [], []
+    for node in nodes:
+        shingles = _shingles(node.node.get_content(metadata_mode=MetadataMode.NONE))
+        duplicate = any(
+            shingles and other and len(shingles & other) / min(len(shingles), len(other)) >= threshold
+            for other in kept_shingles
+        )
+        if not duplicate:
+            kept.append(node)
+            kept_shingles.append(shingles)
+    return kept
+
+
+def retrieval_order_scorer():
+    """Keep the retriever's order."""
+    def score(query, nodes):
+        return [-rank for rank in range(len(nodes))]
+    return score
+
+
+def nvidia_rerank_scorer():
+    """Score nodes with the NVIDIA reranking NIM."""
+    from llama_index.postprocessor.nvidia_rerank import NVIDIARerank
+
+    def score(query, nodes):
+        # A reranker per call: top_n differs per query and queries run concurrently
+        reranker = NVIDIARerank(model=fastapi_config.RERANK_MODEL, api_key=fastapi_config.NVIDIA_API_KEY,
+                                top_n=len(nodes))
+        reranked = reranker.postprocess_nodes(nodes, query_str=query)
+        scores = {node.node.node_id: node.score for node in reranked}
+        return [scores.get(node.node.node_id, float("-inf")) for node in nodes]
+    return score
+
+
+# Scorer factories by RERANK_SCORER name. A scorer maps (query, nodes) to one
+# score per node, higher is better.
+SCORERS = {
+    "none": retrieval_order_scorer,
+    "nvidia": nvidia_rerank_scorer,
+}
+
+
+def get_scorer(name=None):
+    name = name or fastapi_config.RERANK_SCORER
+    try:
+        return SCORERS[name]()
+    except Exception as e:
+        print(f"Error loading reranker '{name}', keeping retrieval order: {e}")
+        return retrieval_order_scorer()
+
+
+class ContextPacker(BaseNodePostprocessor):
+    """Deduplicate, rerank and pack retrieved nodes into a token budget.
+
+    Nodes are added best first while they fit into ``token_budget`` tokens;
+    the best node is always kept.
+    """
+
+    dedup_threshold: float = Field(default=0.6)
+    token_budget: int = Field(default=3000)
+    scorer: Optional[Callable] = Field(default=None, exclude=True)
+    tokenizer: Any = Field(default=None, exclude=True)
+
+    @classmethod
+    def class_name(cls):
+        return "ContextPacker"
+
+    @classmethod
+    def from_config(cls):
+        return cls(dedup_threshold=fastapi_config.CONTEXT_DEDUP_THRESHOLD,
+                   token_budget=fastapi_config.CONTEXT_TOKEN_BUDGET,
+                   scorer=get_scorer(),
+                   tokenizer=get_tokenizer())
+
+    def _postprocess_nodes(self, nodes: List[NodeWithScore], query_bundle: Optional[QueryBundle] = None):
+        if not nodes:
+            return nodes
+        unique = drop_near_duplicates(nodes, self.dedup_threshold)
+        metrics.increment("context_duplicates_dropped", len(nodes) - len(unique))
+
+        if self.scorer is not None and query_bundle is not None and len(unique) > 1:
+            try:
+                scores = self.scorer(query_bundle.query_str, unique)
+                unique = [node for _, node in sorted(zip(scores, unique), key=lambda pair: pair[0], reverse=True)]
+            except Exception as e:
+                # A failed rerank still leaves a usable, fused order
+                print(f"Error reranking nodes, keeping retrieval order: {e}")
+                metrics.increment("rerank_errors")
+
+        tokenizer = self.tokenizer or get_tokenizer()
+        packed, used = [], 0
+        for node in unique:
+            tokens = len(tokenizer(node.node.get_content(metadata_mode=MetadataMode.LLM)))
+            if packed and used + tokens > self.token_budget:
+                continue
+            packed.append(node)
+            used += tokens
+        metrics.increment("context_nodes", len(packed))
+        metrics.increment("context_tokens", used)
+        metrics.increment("context_queries")
+        return packed
@@ -0,0 +1,61 @@
+import os
+import re
+from urllib.parse import unquote, urlparse
+
+# Extensions stripped from a name before it becomes an id, so "Report.pdf",
+# "report" and "report.pptx" all name the same publication.
+PUBLICATION_EXTENSIONS = ('.pdf', '.ppt', '.pptx', '.png', '.jpg', '.jpeg', '.txt')
+# Per-node suffix on the source of PDF text, table and image nodes
+SOURCE_SUFFIX = re.compile(r"-page\d+-(?:block|table|image)\d+$")
+
+
+def publication_id(name):
+    """Return the stable publication id for a file name, path or URL.
+
+    Ids are lower-case slugs of the file name without its extension, and
+    passing an id in again returns it unchanged. URLs lose their query
+    string and names are percent-decoded, so a link to "Some%20Report.pdf"
+    and the uploaded "Some Report.pdf" name the same publication.
+    """
+    if "://" in name:
+        name = urlparse(name).path
+    name = os.path.basename(unquote(name).rstrip("/"))
+    stem, extension = os.path.splitext(name)
+    if extension.lower() in PUBLICATION_EXTENSIONS:
+        name = stem
+    return re.sub(r"[^a-z0-9]+", "-", name.lower()).strip("-")
+
+
+def publication_id_from_source(source):
+    """Return the publication id of a node from its "source" metadata, or None.
+
+    Used to backfill nodes ingested before nodes were tagged.
+    """
+    if not source:
+        return None
+    return publication_id(SOURCE_SUFFIX.sub("", source)) or None
+
+
+def normalize_publication_ids(value):
+    """Turn None, one name or a list of names into a sorted tuple of ids."""
+    if not value:
+        return ()
+    if isinstance(value, str):
+        value = [value]
+    return tuple(sorted({publication_id(name) for name in value if name}))
+
+
+def set_publication_id(node, pub_id):
+    """Set publication_id on a node, hidden from the embedding and LLM text."""
+    node.metadata["publication_id"] = pub_id
+    for excluded in (node.excluded_embed_metadata_keys, node.excluded_llm_metadata_keys):
+        if "publication_id" not in excluded:
+            excluded.append("publication_id")
+
+
+def tag_publication(documents, name):
+    """Yield Documents with publication_id set, see set_publication_id."""
+    pub_id = publication_id(name)
+    for doc in documents:
+        set_publication_id(doc, pub_id)
+        yield doc
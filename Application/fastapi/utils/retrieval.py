@@ -0,0 +1,68 @@
+from llama_index.core.retrievers import BaseRetriever
+from llama_index.core.schema import NodeWithScore
+from llama_index.core.vector_stores import ExactMatchFilter, MetadataFilters
+from config import fastapi_config
+
+
+def publication_filters(publication_id):
+    return MetadataFilters(filters=[ExactMatchFilter(key="publication_id", value=publication_id)])
+
+
+def retrieve_vectors(index, query_bundle, top_k, publication_ids=()):
+    """Dense top_k retrieval, limited to the given publications if any.
+
+    The Milvus integration only pushes down exact-match filters, so each
+    publication gets its own filtered search and the hits are merged by
+    score. The query embedding is computed once and shared.
+    """
+    if not publication_ids:
+        return index.as_retriever(similarity_top_k=top_k).retrieve(query_bundle)
+    results = []
+    for publication_id in publication_ids:
+        retriever = index.as_retriever(similarity_top_k=top_k, filters=publication_filters(publication_id))
+        results.extend(retriever.retrieve(query_bundle))
+    return sorted(results, key=lambda result: result.score or 0.0, reverse=True)[:top_k]
+
+
+def reciprocal_rank_fusion(result_lists, top_k, k=60):
+    """Fuse ranked NodeWithScore lists by summing 1 / (k + rank) per node.
+
+    A node found by several retrievers keeps the first copy seen, so list
+    the retriever whose nodes carry the most complete metadata first.
+    """
+    fused = {}
+    nodes = {}
+    for results in result_lists:
+        for rank, result in enumerate(results, start=1):
+            node_id = result.node.node_id
+            fused[node_id] = fused.get(node_id, 0.0) + 1.0 / (k + rank)
+            nodes.setdefault(node_id, result.node)
+    ranked = sorted(fused.items(), key=lambda item: item[1], reverse=True)[:top_k]
+    return [NodeWithScore(node=nodes[node_id], score=score) for node_id, score in ranked]
+
+
+class HybridRetriever(BaseRetriever):
+    """Dense retrieval from the vector index fused with BM25 from the lexical index.
+
+    Each side fetches ``candidate_k`` nodes; reciprocal rank fusion keeps the
+    best ``top_k``. Exact terms such as tickers and figures that the
+    embedding model blurs are still found by the lexical side. Without a
+    lexical index this is plain dense top_k retrieval. Both sides only
+    search ``publication_ids`` when given.
+    """
+
+    def __init__(self, index, lexical_index=None, top_k=None, candidate_k=None, rrf_k=None, publication_ids=()):
+        super().__init__()
+        self.top_k = top_k or fastapi_config.RETRIEVAL_TOP_K
+        self.candidate_k = candidate_k or fastapi_config.RETRIEVAL_CANDIDATE_K
+        self.rrf_k = rrf_k or fastapi_config.RRF_K
+        self.publication_ids = tuple(publication_ids)
+        self._index = index
+        self._lexical_index = lexical_index
+
+    def _retrieve(self, query_bundle):
+        if self._lexical_index is None:
+            return retrieve_vectors(self._index, query_bundle, self.top_k, self.publication_ids)
+        vector_results = retrieve_vectors(self._index, query_bundle, self.candidate_k, self.publication_ids)
+        lexical_results = self._lexical_index.search(query_bundle.query_str, self.candidate_k, self.publication_ids)
+        return reciprocal_rank_fusion([vector_results, lexical_results], self.top_k, self.rrf_k)
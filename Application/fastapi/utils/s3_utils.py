@@ -1,3 +1,4 @@
+import asyncio
 import boto3
 from botocore.exceptions import ClientError
 from config import fastapi_config
@@ -30,6 +31,62 @@ def upload_file(file_name, bucket_name=fastapi_config.S3_BUCKET_NAME):
         return e
     return response
 
+async def stream_multipart_upload(chunks, key, bucket_name=None, part_size=None, max_concurrency=None):
+    """Upload an async iterator of bytes chunks to S3 as a multipart upload.
+
+    Chunks are regrouped into parts of part_size bytes and up to
+    max_concurrency parts are in flight at once; the producer waits for a
+    free slot before buffering the next part, so memory stays at roughly
+    part_size * (max_concurrency + 1) whatever the object size. The upload is
+    aborted if anything fails. Returns the object's ETag and byte count.
+    """
+    bucket_name = bucket_name or fastapi_config.S3_BUCKET_NAME
+    part_size = part_size or fastapi_config.S3_PART_SIZE
+    max_concurrency = max_concurrency or fastapi_config.S3_UPLOAD_CONCURRENCY
+    s3 = get_s3_client()
+    upload = await asyncio.to_thread(s3.create_multipart_upload, Bucket=bucket_name, Key=key)
+    upload_id = upload["UploadId"]
+    slots = asyncio.Semaphore(max_concurrency)
+    tasks = []
+    buffer = bytearray()
+    total_bytes = 0
+
+    async def send_part(part_number, body):
+        try:
+            response = await asyncio.to_thread(
+                s3.upload_part, Bucket=bucket_name, Key=key, UploadId=upload_id,
+                PartNumber=part_number, Body=body,
+            )
+        finally:
+            slots.release()
+        return {"PartNumber": part_number, "ETag": response["ETag"]}
+
+    async def queue_part(body):
+        await slots.acquire()
+        tasks.append(asyncio.create_task(send_part(len(tasks) + 1, body)))
+
+    try:
+        async for chunk in chunks:
+            buffer += chunk
+            total_bytes += len(chunk)
+            while len(buffer) >= part_size:
+                await queue_part(bytes(buffer[:part_size]))
+                del buffer[:part_size]
+        # The last part may be smaller than the S3 minimum part size
+        if buffer or not tasks:
+            await queue_part(bytes(buffer))
+        parts = await asyncio.gather(*tasks)
+        response = await asyncio.to_thread(
+            s3.complete_multipart_upload, Bucket=bucket_name, Key=key, UploadId=upload_id,
+            MultipartUpload={"Parts": parts},
+        )
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        await asyncio.to_thread(s3.abort_multipart_upload, Bucket=bucket_name, Key=key, UploadId=upload_id)
+        raise
+    return {"key": key, "ETag": response["ETag"], "bytes": total_bytes, "parts": len(parts)}
+
 def download_file(file_name, bucket_name):
     s3 = get_s3_client()
     try:
@@ -0,0 +1,54 @@
+import os
+import pandas as pd
+from config import fastapi_config
+
+
+def table_dir(doc_hash):
+    """Return the directory holding the tables of one document."""
+    return os.path.join(fastapi_config.TABLE_STORE_DIR, doc_hash)
+
+
+def table_path(doc_hash, page_num, table_num, extension="parquet"):
+    """Return the path of a table (or its image, via extension) in the store."""
+    return os.path.join(table_dir(doc_hash), f"page{page_num}-table{table_num}.{extension}")
+
+
+def _parquet_safe_columns(columns):
+    # Parquet needs unique string column names; find_tables can return
+    # duplicates or None for merged header cells.
+    names = []
+    seen = {}
+    for col_idx, column in enumerate(columns):
+        name = str(column) if column not in (None, "") else f"Col{col_idx}"
+        if name in seen:
+            seen[name] += 1
+            name = f"{name}_{seen[name]}"
+        else:
+            seen[name] = 0
+        names.append(name)
+    return names
+
+
+def save_table(doc_hash, page_num, table_num, df):
+    """Write a table to the store as Parquet and return its path.
+
+    Tables are keyed by document hash, page and table number, so ingests of
+    different documents never overwrite each other. The file is written
+    under a temporary name and renamed into place.
+    """
+    path = table_path(doc_hash, page_num, table_num)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    df = df.copy()
+    df.columns = _parquet_safe_columns(df.columns)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    df.to_parquet(tmp_path, index=False)
+    os.replace(tmp_path, path)
+    return path
+
+
+def load_table(metadata):
+    """Return the DataFrame for a table node from its metadata."""
+    path = metadata.get("dataframe")
+    if not path:
+        path = table_path(metadata["doc_hash"], metadata["page_num"], metadata["table_num"])
+    return pd.read_parquet(path)
@@ -0,0 +1,141 @@
+import asyncio
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from config import fastapi_config
+
+
+class VLMCache:
+    """Disk-backed, content-addressed cache for VLM / Deplot / chart LLM outputs.
+
+    Entries are keyed by a hash of the input bytes plus the model name and
+    prompt, and the least recently used entries are evicted once the stored
+    text exceeds ``max_bytes``. Hit and miss counters, and a running total of
+    the stored bytes, live in the same SQLite file, so they add up across
+    parse worker processes and restarts.
+    """
+
+    def __init__(self, path=None, max_bytes=None):
+        self.path = path or fastapi_config.VLM_CACHE_PATH
+        self.max_bytes = max_bytes or fastapi_config.VLM_CACHE_MAX_BYTES
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, last_access REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS entries_last_access ON entries (last_access)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS stats (name TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+        # Caches written before the running total was kept are summed once
+        self._conn.execute(
+            "INSERT OR IGNORE INTO stats (name, value) SELECT 'size_bytes', COALESCE(SUM(size), 0) FROM entries"
+        )
+
+    @staticmethod
+    def make_key(content, model, prompt):
+        """Hash the input bytes together with the model and prompt that consume them."""
+        if isinstance(content, str):
+            content = content.encode("utf-8")
+        digest = hashlib.sha256()
+        digest.update(model.encode("utf-8"))
+        digest.update(b"\0")
+        digest.update(prompt.encode("utf-8"))
+        digest.update(b"\0")
+        digest.update(content)
+        return digest.hexdigest()
+
+    def _bump(self, name, amount=1):
+        self._conn.execute(
+            "INSERT INTO stats (name, value) VALUES (?, ?) "
+            "ON CONFLICT(name) DO UPDATE SET value = value + excluded.value",
+            (name, amount),
+        )
+
+    def get(self, key):
+        """Return the cached value for key, or None on a miss."""
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self._bump("misses")
+                return None
+            self._conn.execute("UPDATE entries SET last_access = ? WHERE key = ?", (time.time(), key))
+            self._bump("hits")
+            return row[0]
+
+    def put(self, key, value):
+        """Store a value and evict least recently used entries beyond max_bytes."""
+        size = len(value.encode("utf-8"))
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                replaced = self._conn.execute("SELECT size FROM entries WHERE key = ?", (key,)).fetchone()
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO entries (key, value, size, last_access) VALUES (?, ?, ?, ?)",
+                    (key, value, size, time.time()),
+                )
+                self._bump("size_bytes", size - (replaced[0] if replaced else 0))
+                total = self._conn.execute("SELECT value FROM stats WHERE name = 'size_bytes'").fetchone()[0]
+                while total > self.max_bytes:
+                    oldest = self._conn.execute(
+                        "SELECT key, size FROM entries ORDER BY last_access LIMIT 1"
+                    ).fetchone()
+                    if oldest is None or oldest[0] == key:
+                        break
+                    self._conn.execute("DELETE FROM entries WHERE key = ?", (oldest[0],))
+                    self._bump("evictions")
+                    self._bump("size_bytes", -oldest[1])
+                    total -= oldest[1]
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def stats(self):
+        """Return hit/miss/eviction counters and the current cache size."""
+        with self._lock:
+            counters = dict(self._conn.execute("SELECT name, value FROM stats").fetchall())
+            (entries,) = self._conn.execute("SELECT COUNT(*) FROM entries").fetchone()
+        hits, misses = counters.get("hits", 0), counters.get("misses", 0)
+        return {
+            "hits": hits,
+            "misses": misses,
+            "evictions": counters.get("evictions", 0),
+            "hit_rate": hits / (hits + misses) if hits + misses else 0.0,
+            "entries": entries,
+            "size_bytes": counters.get("size_bytes", 0),
+            "max_bytes": self.max_bytes,
+        }
+
+
+_cache = None
+_cache_pid = None
+
+
+def get_cache():
+    """Return the per-process VLMCache, or None when caching is disabled."""
+    global _cache, _cache_pid
+    if not fastapi_config.VLM_CACHE_ENABLED:
+        return None
+    # SQLite connections must not be shared across a fork
+    if _cache is None or _cache_pid != os.getpid():
+        _cache = VLMCache()
+        _cache_pid = os.getpid()
+    return _cache
+
+
+async def cached_call(content, model, prompt, compute):
+    """Return the cached output for (content, model, prompt), awaiting compute() on a miss."""
+    cache = get_cache()
+    if cache is None:
+        return await compute()
+    key = VLMCache.make_key(content, model, prompt)
+    # SQLite calls can wait on a locked database; keep them off the shared client loop
+    value = await asyncio.to_thread(cache.get, key)
+    if value is None:
+        value = await compute()
+        await asyncio.to_thread(cache.put, key, value)
+    return value
@@ -1,3 +1,7 @@
+import json
+import os
+import time
+from urllib.parse import unquote, urlparse
 import streamlit as st
 import requests
 import pandas as pd
@@ -6,7 +10,9 @@ st.set_page_config(layout="wide")
 PROCESS_FILES_URL = "http://localhost:8000/process_files/"
 PROCESS_DIR_URL = "http://localhost:8000/process_directory/"
 PROCESS_QUERY_URL = "http://localhost:8000/query"
+STREAM_QUERY_URL = "http://localhost:8000/query/stream"
 LIST_DOCUMENTS_URL = "http://localhost:8000/list_documents_info"
+API_BASE_URL = "http://localhost:8000"
 
 # @st.cache_data
 def fetch_document_info():
@@ -17,6 +23,43 @@ def fetch_document_info():
         st.error("Failed to fetch document information")
         return pd.DataFrame()
 
+def wait_for_job(response, poll_interval=1.0):
+    """Poll an ingestion job until it finishes, showing per-file progress.
+
+    Returns the finished job on success, None otherwise or when response is None.
+    """
+    if response is None or response.status_code != 202:
+        return None
+    status_url = API_BASE_URL + response.json()["status_url"]
+    progress = st.progress(0.0)
+    status_text = st.empty()
+    while True:
+        job = requests.get(status_url).json()
+        files = [f for f in job["files"] if f["stage"] != "skipped"]
+        finished = sum(f["stage"] in ("done", "failed") for f in files)
+        progress.progress(finished / len(files) if files else 0.0)
+        current = next((f for f in files if f["stage"] in ("parsing", "indexing")), None)
+        if current:
+            status_text.write(f"{current['stage'].capitalize()} {current['path']} ({current['documents']} documents)")
+        if job["status"] in ("succeeded", "failed", "cancelled"):
+            status_text.empty()
+            succeeded = job["status"] == "succeeded" and not any(f["stage"] == "failed" for f in files)
+            return job if succeeded else None
+        time.sleep(poll_interval)
+
+def iter_sse(response):
+    """Yield (event, data) pairs from a server-sent-event response."""
+    event, data = "message", []
+    for line in response.iter_lines(decode_unicode=True):
+        if not line:
+            if data:
+                yield event, json.loads("\n".join(data))
+            event, data = "message", []
+        elif line.startswith("event:"):
+            event = line[len("event:"):].strip()
+        elif line.startswith("data:"):
+            data.append(line[len("data:"):].strip())
+
 def main():
     col1, col2 = st.columns([1, 2])
     
@@ -31,7 +74,7 @@ def main():
                 with st.spinner("Processing files..."):
                     files = [("files", file) for file in uploaded_files]
                     response = requests.post(PROCESS_FILES_URL, files=files)
-                    if response.status_code == 200:
+                    if wait_for_job(response):
                         st.success("Files processed and index created!")
                     else:
                         st.error("Error processing files.")
@@ -39,8 +82,8 @@ def main():
             directory_path = st.text_input("Enter directory path:")
             if directory_path and st.button("Process Directory"):
                 with st.spinner("Processing directory..."):
-                    response = requests.post(PROCESS_DIR_URL, json={"directory_path": directory_path})
-                    if response.status_code == 200:
+                    response = requests.post(PROCESS_DIR_URL, params={"directory_path": directory_path})
+                    if wait_for_job(response):
                         st.success("Directory processed and index created!")
                     else:
                         st.error("Error processing directory.")
@@ -57,11 +100,19 @@ def main():
                         st.write(row['summary'][:100] + "..." if len(row['summary']) > 100 else row['summary'])
                         if st.button(f"Select {row['document_name']}", key=f"select_{i}"):
                             with st.spinner(f"Processing {row['document_name']}..."):
-                                response = requests.post(PROCESS_FILES_URL, json={
-                                    "document_name": row['document_name'],
-                                    "s3_pdf_link": row['s3_pdf_link']
-                                })
-                                if response.status_code == 200:
+                                pdf = requests.get(row['s3_pdf_link'])
+                                # Uploaded under its decoded name, e.g. "Some Report.pdf" rather than "Some%20Report.pdf"
+                                filename = unquote(os.path.basename(urlparse(row['s3_pdf_link']).path))
+                                response = requests.post(PROCESS_FILES_URL, files=[
+                                    ("files", (filename, pdf.content, "application/pdf"))
+                                ]) if pdf.ok else None
+                                job = wait_for_job(response)
+                                if job:
+                                    # Chat questions are limited to the selected publication from here on
+                                    st.session_state['publication_ids'] = [
+                                        f["publication_id"] for f in job["files"] if f.get("publication_id")
+                                    ]
+                                    st.session_state['publication_name'] = row['document_name']
                                     st.success(f"{row['document_name']} processed and added to index!")
                                 else:
                                     st.error(f"Error processing {row['document_name']}.")
@@ -71,6 +122,12 @@ def main():
         if 'history' not in st.session_state:
             st.session_state['history'] = []
         
+        if st.session_state.get('publication_ids'):
+            st.caption(f"Searching only: {st.session_state['publication_name']}")
+            if st.button("Search all publications"):
+                st.session_state['publication_ids'] = None
+                st.rerun()
+
         user_input = st.chat_input("Enter your query:")
 
         chat_container = st.container()
@@ -87,12 +144,26 @@ def main():
             with st.chat_message("assistant"):
                 message_placeholder = st.empty()
                 full_response = ""
-                response = requests.post(PROCESS_QUERY_URL, json={"query": user_input})
-                if response.status_code == 200:
-                    full_response = response.json()["response"]
-                    message_placeholder.markdown(full_response)
-                else:
-                    message_placeholder.markdown("Error querying the index.")
+                sources = []
+                payload = {"query": user_input, "publication_ids": st.session_state.get('publication_ids')}
+                with requests.post(STREAM_QUERY_URL, json=payload, stream=True) as response:
+                    if response.status_code == 200:
+                        for event, data in iter_sse(response):
+                            if event == "sources":
+                                sources = data
+                            elif event == "token":
+                                full_response += data
+                                message_placeholder.markdown(full_response + "▌")
+                            elif event == "error":
+                                full_response = "Error querying the index."
+                        message_placeholder.markdown(full_response)
+                        if sources:
+                            with st.expander("Sources"):
+                                for source in sources:
+                                    st.write(f"{source['source']} (page {source['page_num']}, score {source['score']:.3f})"
+                                             if source['score'] is not None else source['source'])
+                    else:
+                        message_placeholder.markdown("Error querying the index.")
             st.session_state['history'].append({"role": "assistant", "content": full_response})
 
         if st.button("Clear Chat"):